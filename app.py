@@ -1,11 +1,19 @@
 #!/usr/bin/env python3
 import os
-import csv
+import json
+import time
+import hashlib
 from pathlib import Path
 from functools import wraps
-from flask import Flask, session, redirect, url_for, render_template, render_template_string, request, flash, jsonify
-import pyotp
+from flask import Flask, session, redirect, url_for, render_template, request, flash, jsonify, Response, after_this_request
 from file.variables_reader import read_variables
+from file.config_snapshot import ConfigStore
+from file import metrics
+from file.file_watch import PollingWatcher, stat_signature
+from file.roster_engine import RosterEngine
+from file.user_store import get_store
+from file.rate_limit import LOGIN_LIMITER, too_many_requests
+from file.session_store import get_session_interface
 
 # ---------------- CONFIG ----------------
 APP_SECRET_KEY = os.environ.get("APP_SECRET_KEY", "change_this_secret")
@@ -20,105 +28,82 @@ VERSION_PATH = DATA_DIR / "version.txt"
 
 app = Flask(__name__, static_folder=str(PAGES_DIR))
 app.secret_key = APP_SECRET_KEY
+# sessions côté serveur si SESSION_BACKEND=memory|sqlite (même store que le panel admin)
+if get_session_interface() is not None:
+    app.session_interface = get_session_interface()
+metrics.instrument_templates(app)
+
+def csv_file_for(variables):
+    if int(variables.get("csv_emplacement_def", "0")) == 1:
+        return "all.csv"
+    return "all_vrai.csv"
 
 vars = read_variables()
-csv_emplacement_def = int(vars.get("csv_emplacement_def", "0"))
-if csv_emplacement_def == 1:
-    csv_emplacement = "all.csv"
-else:
-    csv_emplacement = "all_vrai.csv"
+
+# Un seul thread surveille les fichiers de config et le CSV (FILE_POLL_INTERVAL secondes) ;
+# les handlers ne lisent que les snapshots publiés, sans accès disque.
+watcher = PollingWatcher(interval=float(os.environ.get("FILE_POLL_INTERVAL", "2")), name="app-watch")
+
+# version, secret de débridage et variables.txt (enregistré avant le CSV : le chemin du CSV en dépend)
+config = ConfigStore(VERSION_PATH, UNLOCK_PATH, watcher=watcher)
+
+def roster_csv_path():
+    """
+    CSV courant selon variables.txt (appelé par le thread de surveillance et par
+    roster.load() au préchargement, pas par les requêtes). Ne démarre pas la surveillance :
+    dans le maître gunicorn, aucun thread ne doit tourner avant le fork.
+    """
+    return PAGES_DIR / csv_file_for(config.get(start=False).variables)
+
+# CSV chargé une seule fois en mémoire (colonnes + index), partagé par toutes les recherches
+# et rechargé en arrière-plan quand le fichier change
+roster = RosterEngine(roster_csv_path, watcher=watcher)
 
 # ------------- UTIL ----------------
+# users.txt parsé une fois et mis en cache (partagé avec panel_admin.py), relu si modifié
+user_store = get_store(USERS_PATH)
+
 def load_users():
     """
-    Charge data/users.txt en tolérant un 4ème champ optionnel.
-    Format attendu : username:password:totp_secret[:optional]
-    - Si totp_secret est vide ou 'none' (insensible à la casse) -> 2FA désactivée (totp == None).
-    - Si totp_secret existe mais n'est pas une clé base32 décodable -> on le remplace automatiquement
-      par 'none' (2FA désactivée) dans users.txt.
-    Retourne dict users: { username: {"password": ..., "totp": <secret or None>} }
+    Renvoie le dict des utilisateurs { username: {"password": ..., "totp": <secret or None>, ...} }
+    depuis le cache partagé (voir file/user_store.py pour le format et la normalisation
+    des secrets TOTP invalides). Lecture seule.
     """
-    import base64
-    import binascii
-
-    users = {}
-    if not USERS_PATH.exists():
-        USERS_PATH.write_text("", encoding="utf-8")
-        return users
-
-    text = USERS_PATH.read_text(encoding="utf-8")
-    lines = text.splitlines(keepends=True)  # préserve les fins de lignes pour réécriture fidèle
-    out_lines = []
-    changed = False
-
-    for original_line in lines:
-        line = original_line.rstrip("\r\n")
-        stripped = line.strip()
-        # conservez les lignes vides / commentaires telles quelles
-        if not stripped or stripped.startswith("#"):
-            out_lines.append(original_line)
-            continue
-
-        parts = line.split(":", 3)  # up to 4 parts
-        if len(parts) < 3:
-            # ligne malformée : conservez telle quelle pour ne pas perdre de données
-            out_lines.append(original_line)
-            continue
-
-        username = parts[0].strip()
-        password = parts[1].strip()
-        totp_raw = parts[2].strip()
-        extra = parts[3] if len(parts) == 4 else None
-
-        # Normalisation : empty or "none" => disabled (None)
-        if totp_raw == "" or totp_raw.lower() == "none":
-            totp_val = None
-            normalized_field = "none"
-        else:
-            # Essayer de décoder en base32 pour valider la clé
-            try:
-                # remove spaces and uppercase for base32 decode
-                s = totp_raw.replace(" ", "").upper()
-                # base64.b32decode lève binascii.Error si invalide
-                _ = base64.b32decode(s, casefold=True)
-                totp_val = totp_raw
-                normalized_field = totp_raw
-            except (binascii.Error, Exception):
-                # invalide -> désactiver la 2FA et normaliser à "none"
-                totp_val = None
-                normalized_field = "none"
-
-        users[username] = {"password": password, "totp": totp_val}
-
-        # reconstruire la ligne normalisée ; on inclut l'éventuel 4ème champ tel quel
-        if extra is not None:
-            new_line = f"{username}:{password}:{normalized_field}:{extra}"
-        else:
-            new_line = f"{username}:{password}:{normalized_field}"
-
-        # Comparer avec le champ original pour détecter changement
-        if totp_raw != normalized_field:
-            changed = True
-
-        out_lines.append(new_line + ("\n" if original_line.endswith("\n") else ""))
-
-    # Réécrire le fichier seulement si on a normalisé quelque chose
-    if changed:
-        USERS_PATH.write_text("".join(out_lines), encoding="utf-8")
-
-    return users
+    return user_store.users()
 
 def get_unlock_totp():
-    if UNLOCK_PATH.exists():
-        return pyotp.TOTP(UNLOCK_PATH.read_text().strip())
-    return None
+    return config.get().unlock_totp
 
 def get_version():
-    try:
-        with open(VERSION_PATH, "r", encoding="utf-8") as f:
-            return f.read().strip()
-    except Exception:
-        return "inconnue"
+    return config.get().version
+
+# ------------- CACHE HTTP -------------
+# Contenu authentifié : "private" (jamais dans un cache partagé), "no-cache" (le navigateur
+# revalide à chaque fois). Un If-None-Match correspondant à l'ETag donne un 304 sans corps.
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*parts):
+    key = "\x00".join(str(p) for p in parts)
+    return hashlib.blake2b(key.encode("utf-8", "surrogatepass"), digest_size=12).hexdigest()
+
+def with_cache_headers(response, etag):
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = PRIVATE_CACHE_CONTROL
+    return response
+
+def not_modified(etag):
+    """Réponse 304 si le client a déjà cette version, sinon None."""
+    if request.if_none_match.contains_weak(etag):
+        return with_cache_headers(Response(status=304), etag)
+    return None
+
+# Templates des pages (fichiers de templates/), compilés une seule fois par Jinja
+TEMPLATES = ("login.html", "2fa.html", "search_csv_web.html")
+
+def warm_templates():
+    """Précompile les templates avant la première requête (sinon compilés au premier rendu)."""
+    for name in TEMPLATES:
+        app.jinja_env.get_template(name)
 
 # ------------- DÉCORATEUR -------------
 def login_required(fn):
@@ -142,12 +127,15 @@ def racine_logine_redirecte():
 
 @app.route("/login", methods=["GET","POST"])
 def login():
-    users = load_users()
     version = get_version()
     if request.method == "POST":
         u = request.form.get("username","").strip()
         p = request.form.get("password","").strip()
-        profile = users.get(u)
+        # limitation par IP et par identifiant, avant toute lecture des utilisateurs
+        wait = LOGIN_LIMITER.check(request.remote_addr, u)
+        if wait:
+            return too_many_requests(wait)
+        profile = load_users().get(u)
         if not profile:
             flash("Utilisateur inconnu.", "error")
             return redirect(url_for("login"))
@@ -157,45 +145,18 @@ def login():
             session["pass_ok"] = True
             return redirect(url_for("two_factor"))
         flash("Mot de passe incorrect.", "error")
-    return render_template_string("""
-    <!doctype html>
-    <html lang="fr">
-    <head>
-      <meta charset="utf-8">
-      <title>Connexion</title>
-      <style>
-      body{font-family:Arial,Helvetica,sans-serif;background:#f3f4f6;margin:0;padding:20px}
-      .card{max-width:400px;margin:40px auto;background:white;padding:24px 24px 20px 24px;border-radius:10px;box-shadow:0 8px 30px rgba(0,0,0,0.06)}
-      input{padding:10px;border-radius:8px;border:1px solid #ccc;width:70%;margin-bottom:10px}
-      button{padding:10px 14px;border-radius:8px;border:none;background:#ff7a00;color:white;cursor:pointer;width:100%}
-      .small{font-size:0.9em;color:#555}
-      </style>
-    </head>
-    <body>
-      <div class="card">
-        <h2>Connexion</h2>
-        {% for cat,msg in get_flashed_messages(with_categories=true) %}
-          <p style="color:{{ 'green' if cat=='success' else 'red' }}">{{msg}}</p>
-        {% endfor %}
-        <form method="post" style="display: flex; flex-direction: column; align-items: center;">
-          <input name="username" placeholder="Nom d'utilisateur" autofocus required>
-          <input name="password" type="password" placeholder="Mot de passe" required>
-          <button type="submit">Se connecter</button>
-        </form>
-      </div>
-      <footer style="position:fixed; left:0; bottom:0; width:100%; background-color:#f0f0f0; color:gray; text-align:center; padding:8px 0; font-size:14px;">
-        Vous utilisez la version v{{ version }}
-      </footer>
-    </body>
-    </html>
-    """, version=version)
+    return render_template("login.html", version=version)
 
 @app.route("/2fa", methods=["GET","POST"])
 def two_factor():
     if not session.get("pass_ok") or not session.get("username"):
         return redirect(url_for("login"))
-    users = load_users()
     username = session["username"]
+    if request.method == "POST":
+        wait = LOGIN_LIMITER.check(request.remote_addr, username)
+        if wait:
+            return too_many_requests(wait)
+    users = load_users()
     profile = users.get(username)
     version = get_version()
     if not profile:
@@ -217,8 +178,8 @@ def two_factor():
     if request.method == "POST":
         code = request.form.get("code","").strip()
         try:
-            totp = pyotp.TOTP(totp_secret)
-            if totp.verify(code, valid_window=1):
+            totp = user_store.totp(username)
+            if totp is not None and totp.verify(code, valid_window=1):
                 session.clear()
                 session["authed"] = True
                 session["username"] = username
@@ -230,56 +191,129 @@ def two_factor():
             # protège contre un secret malformé
             error = "Erreur lors de la vérification du TOTP."
 
-    return render_template_string("""
-    <!doctype html>
-    <html lang="fr">
-    <head>
-      <meta charset="utf-8">
-      <title>2FA</title>
-      <style>
-      body{font-family:Arial,Helvetica,sans-serif;background:#f3f4f6;margin:0;padding:20px}
-      .card{max-width:400px;margin:40px auto;background:white;padding:24px 24px 20px 24px;border-radius:10px;box-shadow:0 8px 30px rgba(0,0,0,0.06)}
-      input{padding:10px;border-radius:8px;border:1px solid #ccc;width:70%;margin-bottom:10px}
-      button{padding:10px 14px;border-radius:8px;border:none;background:#ff7a00;color:white;cursor:pointer;width:100%}
-      .small{font-size:0.9em;color:#555}
-      </style>
-    </head>
-    <body>
-      <div class="card">
-        <h2>Code TOTP</h2>
-        {% if error %}<p style="color:red">{{error}}</p>{% endif %}
-        <form method="post" style="display: flex; flex-direction: column; align-items: center;">
-          <input name="code" placeholder="Code à 6 chiffres" autofocus required>
-          <button type="submit">Valider</button>
-        </form>
-      </div>
-      <footer style="position:fixed; left:0; bottom:0; width:100%; background-color:#f0f0f0; color:gray; text-align:center; padding:8px 0; font-size:14px;">
-        Vous utilisez la version v{{ version }}
-      </footer>
-    </body>
-    </html>
-    """, error=error, version=version)
+    return render_template("2fa.html", error=error, version=version)
 
 # Serve la page principale (rendu dynamique pour le footer)
 @app.route("/app")
 @login_required
 def app_page():
     version = get_version()
-    return render_template("search_csv_web.html", version=version)
+    # la page ne dépend que de la version et du template
+    template = os.path.join(app.root_path, app.template_folder, "search_csv_web.html")
+    etag = make_etag("app", version, stat_signature(template))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    return with_cache_headers(app.make_response(render_template("search_csv_web.html", version=version)), etag)
 
 # ------------- ROUTE DE RECHERCHE -------------
+SEARCH_MAX_ROWS = 500    # lignes max par réponse /search (et par page)
+NDJSON_CHUNK_ROWS = 200  # lignes regroupées par morceau envoyé dans le flux NDJSON
+DEBRIDE_HEADERS = ["Classe", "Nom Prénom", "ID", "Password"]
+
+def _observe_search(mode, start):
+    metrics.observe("roster_search_seconds", time.perf_counter() - start,
+                    "Durée de recherche dans l'index du CSV", mode=mode)
+
+def _parse_page(form, snapshot):
+    """
+    Lit limit/cursor. Renvoie ((ligne de départ, limit, nombre de correspondances ou None),
+    None) ou (None, réponse d'erreur).
+    """
+    try:
+        limit = int(form.get("limit") or SEARCH_MAX_ROWS)
+    except ValueError:
+        return None, (jsonify({"status": "error", "error": "limit invalide"}), 400)
+    limit = max(1, min(limit, SEARCH_MAX_ROWS))
+    start = 0
+    matches = None
+    cursor = form.get("cursor") or ""
+    if cursor:
+        # "<version>-<ligne>[-<nombre de correspondances>]"
+        try:
+            parts = [int(x) for x in cursor.split("-")]
+            if len(parts) not in (2, 3):
+                raise ValueError(cursor)
+        except ValueError:
+            return None, (jsonify({"status": "error", "error": "curseur invalide"}), 400)
+        version, start = parts[0], max(0, parts[1])
+        if len(parts) == 3 and parts[2] >= 0:
+            matches = parts[2]
+        if version != snapshot.version:
+            # la liste a été rechargée entre deux pages : les positions ne sont plus valables
+            return None, (jsonify({"status": "error", "error": "liste modifiée, relancer la recherche"}), 409)
+    return (start, limit, matches), None
+
+def _next_cursor(snapshot, next_row, matches=None):
+    """Le nombre de correspondances voyage dans le curseur : les pages suivantes ne le recalculent pas."""
+    if next_row is None:
+        return None
+    if matches is None:
+        return f"{snapshot.version}-{next_row}"
+    return f"{snapshot.version}-{next_row}-{matches}"
+
+def _page_payload(snapshot, q, debride, page, folded=False, **extra):
+    start, limit, known = page
+    rows, next_row, matches = snapshot.page(q, debride=debride, start=start, limit=limit, folded=folded,
+                                            count=known is None)
+    if known is not None:
+        matches = known
+    payload = {
+        "status": "ok", "q": q, "matches": matches, "rows": rows,
+        "limit": limit, "next_cursor": _next_cursor(snapshot, next_row, matches),
+    }
+    payload.update(extra)
+    return payload
+
+def _ndjson_response(snapshot, q, debride, page, folded=False):
+    """
+    Export en flux NDJSON : une ligne d'en-tête, puis une ligne JSON par résultat, puis une
+    ligne de fin {"status": "done", "rows": n, "next_cursor": ...}. Sans limit, le mode
+    débridé exporte toutes les correspondances ; le mode normal reste plafonné.
+    """
+    start, limit = page[:2] if page is not None else (0, None)
+    if not debride:
+        limit = min(limit or SEARCH_MAX_ROWS, SEARCH_MAX_ROWS)
+    header = {"status": "ok", "mode": "debride" if debride else "normal", "q": q}
+    if debride:
+        header["headers"] = DEBRIDE_HEADERS
+
+    def generate():
+        yield json.dumps(header, ensure_ascii=False) + "\n"
+        n = 0
+        next_row = None
+        chunk = []
+        try:
+            for i in snapshot.iter_match_ids(q, debride=debride, start=start, folded=folded):
+                if limit is not None and n == limit:
+                    next_row = i
+                    break
+                chunk.append(json.dumps(snapshot.row(i), ensure_ascii=False))
+                n += 1
+                if len(chunk) == NDJSON_CHUNK_ROWS:
+                    yield "\n".join(chunk) + "\n"
+                    chunk = []
+            if chunk:
+                yield "\n".join(chunk) + "\n"
+        except Exception:
+            app.logger.exception("Erreur pendant l'export NDJSON")
+            yield json.dumps({"status": "error", "error": "erreur lors de la recherche"}) + "\n"
+            return
+        yield json.dumps({"status": "done", "rows": n, "next_cursor": _next_cursor(snapshot, next_row)}) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
 @app.route("/search", methods=["POST"])
 @login_required
 def search():
     version = get_version()
     q_raw = (request.form.get("q") or "").strip()
-    results = []
-    csv_path = PAGES_DIR / csv_emplacement
 
     # --- VERIFICATION DU CODE DEVERROUILLAGE (unlock) ---
+    # seules les requêtes de 6 chiffres peuvent être un code : les autres ne coûtent aucun HMAC
     try:
         unlock_totp = get_unlock_totp()
-        if unlock_totp and q_raw:
+        if unlock_totp and q_raw and unlock_totp.could_be_code(q_raw):
             # si le code soumis correspond au TOTP d'unlock -> active la session debride
             if unlock_totp.verify(q_raw, valid_window=1):
                 session["debride"] = True
@@ -287,75 +321,92 @@ def search():
     except Exception:
         app.logger.exception("Erreur lors de la vérification du TOTP d'unlock")
 
+    debride = request.form.get("debride", "").lower() in ("1", "true", "yes") and bool(session.get("debride"))
+    # fold=1 : recherche sans accents ni casse sur les colonnes nom et identifiant
+    folded = request.form.get("fold", "").lower() in ("1", "true", "yes")
+    snapshot = roster.snapshot()  # même snapshot pour toute la requête (et tout le flux NDJSON)
+
+    # --- CACHE HTTP (après le déverrouillage, qui ne doit jamais être court-circuité) ---
+    # l'ETag couvre le contenu du CSV, le mode effectif et tous les paramètres de la requête ;
+    # les exports NDJSON ne sont pas concernés
+    if request.form.get("format") != "ndjson":
+        etag = make_etag("search", snapshot.digest, "debride" if debride else "normal", folded, q_raw,
+                         request.form.get("limit") or "", request.form.get("cursor") or "")
+        cached = not_modified(etag)
+        if cached is not None:
+            metrics.inc("search_not_modified_total", "Recherches servies en 304")
+            return cached
+
+        @after_this_request
+        def _cache_headers(response):
+            if response.status_code == 200:
+                with_cache_headers(response, etag)
+            return response
+
+    # --- PAGINATION / FLUX (optionnels) ---
+    # limit/cursor : pages de `limit` lignes ; le curseur "<version>-<ligne>" reprend la
+    # recherche là où la page précédente s'est arrêtée, sans refaire les lignes déjà vues.
+    page = None
+    if request.form.get("limit") or request.form.get("cursor"):
+        page, error = _parse_page(request.form, snapshot)
+        if error:
+            return error
+    if request.form.get("format") == "ndjson":
+        return _ndjson_response(snapshot, q_raw, debride, page, folded=folded)
+
     # --- MODE DEBRIDE ---
+    start = time.perf_counter()
     try:
-        if request.form.get("debride", "").lower() in ("1", "true", "yes") and session.get("debride"):
-            headers = ["Classe", "Nom Prénom", "ID", "Password"]
-            if csv_path.exists():
-                q_low = q_raw.lower()
-                with open(csv_path, newline="", encoding="utf-8") as cf:
-                    reader = csv.reader(cf)
-                    # Skip header if present
-                    _ = next(reader, None)
-                    for row in reader:
-                        if not row:
-                            continue
-                        try:
-                            if any(q_low in (str(c) or "").lower() for c in row):
-                                out = [
-                                    row[0] if len(row) > 0 else "",
-                                    row[1] if len(row) > 1 else "",
-                                    row[4] if len(row) > 4 else "",
-                                    row[5] if len(row) > 5 else "",
-                                ]
-                                results.append(out)
-                        except Exception:
-                            # protège contre lignes malformées
-                            app.logger.exception("Erreur lors du traitement d'une ligne CSV (debride)")
-            return jsonify({"status": "ok", "mode": "debride", "q": q_raw, "matches": len(results), "rows": results[:500], "headers": headers})
+        if debride:
+            if page is not None:
+                payload = _page_payload(snapshot, q_raw, True, page, folded=folded, mode="debride", headers=DEBRIDE_HEADERS)
+                _observe_search("debride", start)
+                return jsonify(payload)
+            results, _, matches = snapshot.page(q_raw, debride=True, limit=SEARCH_MAX_ROWS, folded=folded)
+            _observe_search("debride", start)
+            return jsonify({"status": "ok", "mode": "debride", "q": q_raw, "matches": matches, "rows": results, "headers": DEBRIDE_HEADERS})
     except Exception:
         app.logger.exception("Erreur pendant la recherche en mode débridé")
         return jsonify({"status": "error", "error": "erreur lors de la recherche (debride)"}), 500
 
     # --- MODE NORMAL ---
+    # recherche exacte sur la colonne id (index 4) + partielle sur toute la ligne (sensible à la casse)
     try:
-        if csv_path.exists():
-            with open(csv_path, newline="", encoding="utf-8") as cf:
-                reader = csv.reader(cf)
-                headers = next(reader, None)
-                for row in reader:
-                    if not row:
-                        continue
-                    # recherche exact sur la colonne id (index 4)
-                    if len(row) > 4 and row[4] == q_raw:
-                        out = [
-                            row[0] if len(row) > 0 else "",
-                            row[1] if len(row) > 1 else "",
-                            row[4] if len(row) > 4 else "",
-                            row[5] if len(row) > 5 else "",
-                        ]
-                        results.append(out)
-                        continue
-                    # recherche partielle sur toute la ligne (sensible à la casse)
-                    try:
-                        found = any(q_raw in (str(cell) or "") for cell in row)
-                    except Exception:
-                        found = False
-                        app.logger.exception("Erreur lors de la comparaison d'une cellule CSV (normal)")
-                    if found:
-                        out = [
-                            row[0] if len(row) > 0 else "",
-                            row[1] if len(row) > 1 else "",
-                            row[4] if len(row) > 4 else "",
-                            row[5] if len(row) > 5 else "",
-                        ]
-                        results.append(out)
+        if page is not None:
+            payload = _page_payload(snapshot, q_raw, False, page, folded=folded)
+            _observe_search("normal", start)
+            return jsonify(payload)
+        results, _, matches = snapshot.page(q_raw, limit=SEARCH_MAX_ROWS, folded=folded)
+        _observe_search("normal", start)
     except Exception:
         app.logger.exception("Erreur pendant la recherche en mode normal")
         return jsonify({"status": "error", "error": "erreur lors de la recherche (normal)"}), 500
 
     # Toujours retourner un JSON valide
-    return jsonify({"status": "ok", "q": q_raw, "matches": len(results), "rows": results[:500]})
+    return jsonify({"status": "ok", "q": q_raw, "matches": matches, "rows": results})
+
+SUGGEST_DEFAULT = 10
+SUGGEST_MAX = 50
+
+@app.route("/search/suggest", methods=["GET"])
+@login_required
+def search_suggest():
+    """Suggestions pendant la saisie : identifiants et noms commençant par `prefix`."""
+    prefix = (request.args.get("prefix") or "").strip()
+    try:
+        k = int(request.args.get("k") or SUGGEST_DEFAULT)
+    except ValueError:
+        return jsonify({"status": "error", "error": "k invalide"}), 400
+    k = max(1, min(k, SUGGEST_MAX))
+    start = time.perf_counter()
+    try:
+        suggestions = roster.snapshot().suggest(prefix, k)
+    except Exception:
+        app.logger.exception("Erreur pendant les suggestions")
+        return jsonify({"status": "error", "error": "erreur lors des suggestions"}), 500
+    _observe_search("suggest", start)
+    return jsonify({"status": "ok", "prefix": prefix, "suggestions": suggestions})
+
 @app.route("/status")
 @login_required
 def status():
@@ -377,5 +428,6 @@ else:
 if __name__ == "__main__":
     if not UNLOCK_PATH.exists():
         UNLOCK_PATH.write_text("NB2WY3DPEHPK3PXPJBSWY3DP", encoding="utf-8")
+    warm_templates()
     print(f"Serveur: http://{hote}:{port}/login")
     app.run(host=hote, port=port, debug=True)
\ No newline at end of file
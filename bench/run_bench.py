@@ -0,0 +1,223 @@
+"""
+bench/run_bench.py - mesures reproductibles des chemins /search, /login -> /2fa et admin
+
+Génère des données synthétiques dans un dossier temporaire (CSV au format de all.csv et
+users.txt), branche app.py et panel_admin.py dessus, puis pilote les clients de test
+Flask. Le résultat est un JSON (p50/p95/p99 en ms et débit en requêtes/s par scénario) à
+comparer d'un commit à l'autre.
+
+Usage :
+    python bench/run_bench.py                                  # tailles 500, 50000, 1000000
+    python bench/run_bench.py --sizes 500,50000 --iterations 100 --out bench_output.json
+    python bench/run_bench.py --users 5000 --seed 1
+
+Les données sont déterministes pour une graine donnée (--seed).
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pyotp  # noqa: E402
+
+from generateur.gen_password_csv import SURNAMES, write_synthetic_roster  # noqa: E402
+
+PASSWORD_ALPHABET = string.ascii_uppercase + string.digits
+
+
+# ---------- données synthétiques ----------
+def write_roster(path, rows, seed):
+    """CSV au schéma de all.csv (generateur/gen_password_csv.py) ; renvoie la liste des identifiants."""
+    write_synthetic_roster(path, rows, seed=seed)
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return [row[4] for row in reader]
+
+
+def write_users(path, count, rng):
+    """users.txt avec `count` comptes (un sur deux avec TOTP) ; renvoie {uid: (pwd, secret)}."""
+    users = {}
+    with open(path, "w", encoding="utf-8") as f:
+        for n in range(count):
+            uid = f"user{n}.bench"
+            pwd = "".join(rng.choice(PASSWORD_ALPHABET) for _ in range(6))
+            secret = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ234567") for _ in range(32)) if n % 2 == 0 else None
+            mode = "admin" if n == 0 else "user"
+            f.write(f"{uid}:{pwd}:{secret or 'none'}:{mode}\n")
+            users[uid] = (pwd, secret)
+    return users
+
+
+# ---------- mesure ----------
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run_scenario(fn, iterations, warmup=3):
+    """Appelle fn(i) `iterations` fois ; renvoie les statistiques en millisecondes."""
+    for i in range(min(warmup, iterations)):
+        fn(i)
+    durations = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(i)
+        durations.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    durations.sort()
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(durations, 50) * 1000, 4),
+        "p95_ms": round(percentile(durations, 95) * 1000, 4),
+        "p99_ms": round(percentile(durations, 99) * 1000, 4),
+        "mean_ms": round(sum(durations) / len(durations) * 1000, 4) if durations else 0.0,
+        "throughput_rps": round(iterations / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def check(response, expected=200):
+    if response.status_code != expected:
+        raise RuntimeError(f"statut {response.status_code} (attendu {expected}) : {response.data[:200]!r}")
+    return response
+
+
+# ---------- scénarios ----------
+def bench_search(main_module, roster_path, ids, iterations, rng):
+    from file.roster_engine import RosterEngine
+
+    main_module.roster = RosterEngine(roster_path)
+    t0 = time.perf_counter()
+    main_module.roster.load()
+    load_ms = round((time.perf_counter() - t0) * 1000, 2)
+
+    client = main_module.app.test_client()
+    with client.session_transaction() as s:
+        s["authed"] = True
+        s["username"] = "bench"
+        s["debride"] = True
+
+    exact = [rng.choice(ids) for _ in range(iterations)]
+    partial = [rng.choice(SURNAMES)[1:4] for _ in range(iterations)]
+    debride = [rng.choice(SURNAMES)[:3].lower() for _ in range(iterations)]
+    return {
+        "load_ms": load_ms,
+        "search_exact": run_scenario(lambda i: check(client.post("/search", data={"q": exact[i]})), iterations),
+        "search_partial": run_scenario(lambda i: check(client.post("/search", data={"q": partial[i]})), iterations),
+        "search_debride": run_scenario(
+            lambda i: check(client.post("/search", data={"q": debride[i], "debride": "1"})), iterations),
+    }
+
+
+def bench_login(main_module, users, iterations, rng):
+    with_totp = [(u, p, s) for u, (p, s) in users.items() if s]
+    picks = [rng.choice(with_totp) for _ in range(iterations)]
+
+    def flow(i):
+        uid, pwd, secret = picks[i]
+        client = main_module.app.test_client()
+        check(client.post("/login", data={"username": uid, "password": pwd}), 302)
+        check(client.get("/2fa"))
+        r = check(client.post("/2fa", data={"code": pyotp.TOTP(secret).now()}), 302)
+        if not r.location.endswith("/app"):
+            raise RuntimeError(f"2FA refusée pour {uid}")
+
+    return {"login_2fa": run_scenario(flow, iterations)}
+
+
+def bench_admin(panel_module, iterations):
+    client = panel_module.app.test_client()
+    with client.session_transaction() as s:
+        s["admin_user"] = "user0.bench"
+
+    def mutations(i):
+        uid = f"bench.mut{i}"
+        check(client.post("/adminpanel/add_user", data={"id": uid, "pwd": "PWD123", "mode": "user"}), 302)
+        check(client.post("/adminpanel/set_role", data={"id": uid, "mode": "admin"}), 302)
+        check(client.post("/adminpanel/remove_user", data={"id": uid}), 302)
+
+    return {
+        "admin_mutations": run_scenario(mutations, iterations),
+        "admin_panel_render": run_scenario(lambda i: check(client.get("/adminpanel/panel")), iterations),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks /search, /login -> /2fa et panel admin.")
+    parser.add_argument("--sizes", default="500,50000,1000000", help="tailles de CSV (lignes), séparées par des virgules")
+    parser.add_argument("--users", type=int, default=5000, help="nombre de comptes dans users.txt")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="fichier JSON de sortie (défaut : stdout)")
+    args = parser.parse_args(argv)
+
+    os.chdir(ROOT)
+    # toutes les connexions du bench viennent de la même adresse : pas de limitation
+    os.environ["LOGIN_LIMIT"] = "0"
+    # peu de requêtes distinctes par scénario : avec le cache de résultats, on mesurerait
+    # surtout des hits et non la recherche elle-même
+    os.environ["SEARCH_CACHE_SIZE"] = "0"
+    import app as main_module
+    import panel_admin
+    from file.user_store import UserStore
+
+    rng = random.Random(args.seed)
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "users": args.users,
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="webmagret-bench-") as tmp:
+        users_path = os.path.join(tmp, "users.txt")
+        users = write_users(users_path, args.users, rng)
+        # les deux apps partagent le même UserStore, écriture immédiate pour mesurer le coût réel
+        store = UserStore(users_path, flush_delay=0)
+        main_module.user_store = store
+        panel_admin.user_store = store
+
+        for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+            roster_path = os.path.join(tmp, f"roster_{size}.csv")
+            ids = write_roster(roster_path, size, args.seed)
+            iterations = args.iterations if size <= 50000 else max(10, args.iterations // 10)
+            print(f"[bench] CSV {size} lignes ({iterations} itérations)...", file=sys.stderr)
+            report["results"][f"roster_{size}"] = bench_search(main_module, roster_path, ids, iterations, rng)
+
+        print("[bench] login -> 2fa, admin...", file=sys.stderr)
+        report["results"]["auth"] = bench_login(main_module, users, args.iterations, rng)
+        report["results"]["admin"] = bench_admin(panel_admin, args.iterations)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# Compression des réponses (gzip, ou brotli si le module est installé) pour l'application
+# combinée de run_all.py.
+# - seules les réponses 200 de type texte/JSON/NDJSON/JS/CSS/SVG sont compressées, et
+#   seulement au-delà de `min_size` octets quand la taille est connue ;
+# - une réponse sans Content-Length (flux NDJSON) est compressée morceau par morceau,
+#   chaque morceau étant vidé (flush) pour que le client le reçoive sans attendre la fin ;
+# - une réponse déjà encodée (Content-Encoding) ou partielle (206) est laissée telle quelle ;
+# - "Vary: Accept-Encoding" est ajouté dès que la réponse aurait pu être compressée, pour
+#   qu'un cache ne serve pas la version gzip à un client qui ne la comprend pas.
+
+import os
+import zlib
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+def _accepted(accept_encoding):
+    """Encodages acceptés par le client (q > 0), en minuscules."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(coding)
+    return accepted
+
+
+class _Gzip:
+    name = "gzip"
+
+    def __init__(self, level):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 : en-tête gzip
+
+    def compress(self, data):
+        return self._z.compress(data)
+
+    def flush(self):
+        return self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._z.flush()
+
+
+class _Brotli:
+    name = "br"
+
+    def __init__(self, level):
+        # qualité 0-11 ; au-delà de 5 le coût CPU dépasse le gain pour des réponses dynamiques
+        self._c = brotli.Compressor(quality=min(level, 5))
+
+    def compress(self, data):
+        return self._c.process(data)
+
+    def flush(self):
+        return self._c.flush()
+
+    def finish(self):
+        return self._c.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size=1024, level=6):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+
+    @classmethod
+    def wrap(cls, app):
+        """COMPRESS=0 désactive ; COMPRESS_MIN_SIZE (1024 octets), COMPRESS_LEVEL (6)."""
+        if os.environ.get("COMPRESS", "1") == "0":
+            return app
+        return cls(app,
+                   min_size=int(os.environ.get("COMPRESS_MIN_SIZE", "1024")),
+                   level=int(os.environ.get("COMPRESS_LEVEL", "6")))
+
+    def _encoder(self, environ):
+        accepted = _accepted(environ.get("HTTP_ACCEPT_ENCODING"))
+        if brotli is not None and "br" in accepted:
+            return _Brotli(self.level)
+        if "gzip" in accepted:
+            return _Gzip(self.level)
+        return None
+
+    def __call__(self, environ, start_response):
+        state = {"encoder": None, "stream": False}
+
+        def _start_response(status, headers, exc_info=None):
+            names = {k.lower(): v for k, v in headers}
+            content_type = names.get("content-type", "").lower()
+            length = names.get("content-length")
+            if (not status.startswith("200")
+                    or "content-encoding" in names
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or environ.get("REQUEST_METHOD") == "HEAD"):
+                return start_response(status, headers, exc_info)
+            vary = names.get("vary")
+            headers = [(k, v) for k, v in headers if k.lower() != "vary"]
+            if not vary:
+                headers.append(("Vary", "Accept-Encoding"))
+            elif "accept-encoding" not in vary.lower():
+                headers.append(("Vary", vary + ", Accept-Encoding"))
+            else:
+                headers.append(("Vary", vary))
+            if length is not None and length.isdigit() and int(length) < self.min_size:
+                return start_response(status, headers, exc_info)
+            encoder = self._encoder(environ)
+            if encoder is None:
+                return start_response(status, headers, exc_info)
+            state["encoder"] = encoder
+            state["stream"] = length is None
+            headers = [(k, v) for k, v in headers if k.lower() != "content-length"]
+            headers.append(("Content-Encoding", encoder.name))
+            write = start_response(status, headers, exc_info)
+
+            def _write(data):
+                # API write() héritée de WSGI : chaque appel est envoyé immédiatement
+                out = encoder.compress(data) + encoder.flush()
+                if out:
+                    write(out)
+            return _write
+
+        body = self.app(environ, _start_response)
+        if state["encoder"] is None:
+            return body
+        return _CompressedBody(body, state["encoder"], state["stream"])
+
+
+class _CompressedBody:
+    """Corps compressé ; close() ferme toujours le corps d'origine (même jamais parcouru)."""
+
+    def __init__(self, body, encoder, stream):
+        self._body = body
+        self._encoder = encoder
+        self._stream = stream
+
+    def __iter__(self):
+        encoder = self._encoder
+        for chunk in self._body:
+            if not chunk:
+                continue
+            out = encoder.compress(chunk)
+            if self._stream:
+                out += encoder.flush()
+            if out:
+                yield out
+        yield encoder.finish()
+
+    def close(self):
+        if hasattr(self._body, "close"):
+            self._body.close()
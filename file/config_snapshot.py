@@ -0,0 +1,103 @@
+# Configuration lue par les handlers : version (data/version.txt), secret de débridage
+# (data/unlock_secret.txt) et variables (data/variables.txt, via variables_reader).
+# Les fichiers sont lus une fois ; le thread de surveillance (file_watch) compare leurs
+# signatures et publie un nouveau ConfigSnapshot si l'un d'eux change.
+# Les handlers lisent le snapshot publié sans verrou ni accès disque.
+
+import threading
+
+from file import metrics
+from file.file_watch import PollingWatcher, stat_signature
+from file.totp_cache import CachedTOTP
+from file.variables_reader import VARIABLES_FILE, read_variables
+
+try:
+    import pyotp
+except Exception:
+    pyotp = None
+
+
+class ConfigSnapshot:
+    """Valeurs de configuration figées (ne pas modifier une instance publiée)."""
+
+    def __init__(self, version, unlock_secret, variables, signature=None):
+        self.version = version
+        self.unlock_secret = unlock_secret
+        self.unlock_totp = CachedTOTP(pyotp.TOTP(unlock_secret), kind="unlock") if (unlock_secret and pyotp is not None) else None
+        self.variables = variables
+        self.signature = signature
+
+
+def _read_version(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except Exception:
+        return "inconnue"
+
+
+def _read_unlock_secret(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+class ConfigStore:
+    def __init__(self, version_path, unlock_path, variables_path=VARIABLES_FILE, poll_interval=2.0, watcher=None):
+        self.version_path = version_path
+        self.unlock_path = unlock_path
+        self.variables_path = variables_path
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.watcher = watcher or PollingWatcher(interval=poll_interval, name="config-watch")
+        self.watcher.add(self.refresh)
+
+    def _signature(self):
+        return (
+            stat_signature(self.version_path),
+            stat_signature(self.unlock_path),
+            stat_signature(self.variables_path),
+        )
+
+    def _load(self, signature):
+        metrics.record_file_read("config")
+        self._snapshot = ConfigSnapshot(
+            _read_version(self.version_path),
+            _read_unlock_secret(self.unlock_path),
+            read_variables(),
+            signature,
+        )
+        return self._snapshot
+
+    def load(self):
+        """Chargement synchrone sans démarrer la surveillance (préchargement avant fork)."""
+        with self._lock:
+            return self._load(self._signature())
+
+    def get(self, start=True):
+        """
+        Snapshot courant (premier appel : chargement synchrone).
+        start=False : ne démarre pas la surveillance (code appelé pendant le préchargement,
+        dans le processus maître, avant le fork des workers).
+        """
+        snap = self._snapshot
+        if snap is None:
+            with self._lock:
+                snap = self._snapshot or self._load(self._signature())
+        if start:
+            self.watcher.ensure_started()
+        return snap
+
+    def refresh(self):
+        """Appelé par le thread de surveillance ; renvoie True si un nouveau snapshot est publié."""
+        snap = self._snapshot
+        if snap is None:
+            return False
+        signature = self._signature()
+        if signature == snap.signature:
+            return False
+        with self._lock:
+            self._load(signature)
+        return True
@@ -0,0 +1,69 @@
+# Surveillance de fichiers par sondage (os.stat) dans un thread d'arrière-plan.
+# Les handlers Flask ne font jamais de stat : ils lisent la dernière version publiée,
+# c'est ce thread qui détecte les changements et reconstruit les structures.
+
+import logging
+import os
+import threading
+
+log = logging.getLogger(__name__)
+
+
+def stat_signature(path):
+    """
+    Signature (inode, taille, mtime en ns) d'un fichier, ou None s'il n'existe pas.
+    Un remplacement atomique (os.replace) change l'inode, une réécriture sur place
+    change la taille et/ou la mtime.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class PollingWatcher:
+    """
+    Thread démon qui appelle périodiquement des fonctions de vérification.
+    Chaque fonction fait son propre stat et son propre rechargement ; une exception
+    est journalisée sans arrêter le thread.
+    Le thread est (re)démarré à la demande par ensure_started(), ce qui le rend sûr
+    après un fork (les threads ne survivent pas au fork d'un worker gunicorn).
+    """
+
+    def __init__(self, interval=2.0, name="file-watch"):
+        self.interval = interval
+        self.name = name
+        self._checks = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def add(self, check):
+        with self._lock:
+            self._checks.append(check)
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        self._stop.set()
+        self._pid = None
+
+    def _run(self):
+        stop = self._stop
+        while not stop.wait(self.interval):
+            for check in list(self._checks):
+                try:
+                    check()
+                except Exception:
+                    log.exception("Erreur dans la surveillance de fichiers (%s)", self.name)
@@ -0,0 +1,199 @@
+# Instrumentation légère : compteurs et histogrammes en mémoire, exportés au format texte
+# Prometheus (panel admin : /adminpanel/metrics).
+# Coût par mesure : un perf_counter() et une prise de verrou ; laissé actif en production.
+# Avec plusieurs workers (run_all --prod), chaque processus a ses propres valeurs.
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# bornes (secondes) adaptées à des requêtes de l'ordre de la ms
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels:
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # dernier seau : +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families = {}  # nom -> (type, aide, {labels: métrique})
+
+    def _get(self, kind, factory, name, help_text, labels):
+        key = tuple(sorted(labels.items()))
+        family = self._families.get(name)
+        if family is not None:
+            metric = family[2].get(key)
+            if metric is not None:
+                return metric
+        with self._lock:
+            family = self._families.setdefault(name, (kind, help_text, {}))
+            return family[2].setdefault(key, factory())
+
+    def counter(self, name, help_text="", **labels):
+        return self._get("counter", Counter, name, help_text, labels)
+
+    def histogram(self, name, help_text="", **labels):
+        return self._get("histogram", Histogram, name, help_text, labels)
+
+    def render(self):
+        """Export au format texte Prometheus (version 0.0.4)."""
+        out = []
+        for name, (kind, help_text, metrics) in sorted(self._families.items()):
+            if help_text:
+                out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            for key, metric in sorted(metrics.items()):
+                if kind == "counter":
+                    out.append(f"{name}{_format_labels(key)} {metric.value}")
+                    continue
+                with metric._lock:
+                    counts = list(metric.counts)
+                    total, count = metric.sum, metric.count
+                cumulative = 0
+                for bound, c in zip(metric.buckets + (float("inf"),), counts):
+                    cumulative += c
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    out.append(f"{name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+                out.append(f"{name}_sum{_format_labels(key)} {total}")
+                out.append(f"{name}_count{_format_labels(key)} {count}")
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def inc(name, help_text="", n=1, **labels):
+    REGISTRY.counter(name, help_text, **labels).inc(n)
+
+
+def observe(name, value, help_text="", **labels):
+    REGISTRY.histogram(name, help_text, **labels).observe(value)
+
+
+@contextmanager
+def timed(name, help_text="", **labels):
+    """with timed("roster_load_seconds"): ... -> durée observée dans l'histogramme."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, help_text, **labels)
+
+
+def record_file_read(kind):
+    inc("file_reads_total", "Lectures de fichiers de données", file=kind)
+
+
+def record_cache(cache, hit):
+    inc("cache_requests_total", "Accès aux caches en mémoire", cache=cache, result="hit" if hit else "miss")
+
+
+# ---------- WSGI / Flask ----------
+class _ClosingIterator:
+    """Enveloppe le corps de la réponse : la durée est mesurée jusqu'à close() (flux inclus)."""
+
+    def __init__(self, iterable, on_close):
+        self._iterable = iterable
+        self._on_close = on_close
+
+    def __iter__(self):
+        return iter(self._iterable)
+
+    def close(self):
+        try:
+            if hasattr(self._iterable, "close"):
+                self._iterable.close()
+        finally:
+            self._on_close()
+
+
+class MetricsMiddleware:
+    """
+    Middleware WSGI : histogramme http_request_duration_seconds par route, méthode et
+    classe de statut. `routes` limite les libellés aux routes connues (le reste -> "other")
+    pour garder un nombre de séries borné.
+    """
+
+    def __init__(self, app, routes=()):
+        self.app = app
+        self.routes = frozenset(routes)
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        path = environ.get("PATH_INFO", "") or "/"
+        route = path if path in self.routes else "other"
+        method = environ.get("REQUEST_METHOD", "GET")
+        status = ["0"]
+
+        def _start_response(status_line, headers, exc_info=None):
+            status[0] = status_line[:1] + "xx"
+            return start_response(status_line, headers, exc_info)
+
+        def _done():
+            observe("http_request_duration_seconds", time.perf_counter() - start,
+                    "Durée des requêtes HTTP", route=route, method=method, status=status[0])
+
+        try:
+            body = self.app(environ, _start_response)
+        except Exception:
+            status[0] = "5xx"
+            _done()
+            raise
+        return _ClosingIterator(body, _done)
+
+
+def static_routes(flask_app):
+    """Routes sans paramètre d'une app Flask (libellés autorisés pour MetricsMiddleware)."""
+    return [r.rule for r in flask_app.url_map.iter_rules() if "<" not in r.rule]
+
+
+def instrument_templates(flask_app):
+    """Mesure la durée de rendu de chaque template (signaux Flask)."""
+    from flask import before_render_template, g, template_rendered
+
+    def _before(sender, template, context, **extra):
+        g._metrics_render_start = time.perf_counter()
+
+    def _after(sender, template, context, **extra):
+        start = g.pop("_metrics_render_start", None)
+        if start is not None:
+            observe("template_render_seconds", time.perf_counter() - start,
+                    "Durée de rendu des templates", template=template.name or "inline")
+
+    before_render_template.connect(_before, flask_app, weak=False)
+    template_rendered.connect(_after, flask_app, weak=False)
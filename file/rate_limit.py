@@ -0,0 +1,113 @@
+# Limitation des tentatives de connexion (app.py : /login, /2fa ; panel : login, 2FA).
+# Seau à jetons par adresse IP et par identifiant : chaque tentative consomme un jeton,
+# les jetons se rechargent à débit constant jusqu'à `burst`. Une tentative refusée est
+# rejetée (429) avant toute lecture de users.txt ou calcul TOTP.
+# Mémoire bornée : au plus `max_keys` seaux par limiteur (les moins récemment utilisés
+# sont évincés), et les seaux redevenus pleins (inactifs) sont purgés périodiquement.
+# Avec plusieurs workers, chaque processus a ses propres compteurs.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from file import metrics
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, max_keys=100000, sweep_interval=30.0, name="bucket"):
+        """rate : jetons par seconde ; burst : capacité (tentatives consécutives permises)."""
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self.name = name
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # clé -> [jetons, instant de mise à jour], du moins au plus récent
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key, now=None):
+        """Consomme un jeton. Renvoie 0 si permis, sinon le délai (secondes) avant le prochain jeton."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return 0.0
+            return (1.0 - bucket[0]) / self.rate if self.rate > 0 else self.sweep_interval
+
+    def _sweep(self, now):
+        # ordre d'utilisation : on s'arrête au premier seau encore actif
+        buckets = self._buckets
+        while buckets:
+            key, (tokens, last) = next(iter(buckets.items()))
+            if tokens + (now - last) * self.rate < self.burst:
+                break
+            del buckets[key]
+        self._next_sweep = now + self.sweep_interval
+
+
+class LoginLimiter:
+    """Seaux par IP et par identifiant ; une tentative doit être permise par les deux."""
+
+    def __init__(self, per_ip, per_user, enabled=True):
+        self.per_ip = per_ip
+        self.per_user = per_user
+        self.enabled = enabled
+
+    @classmethod
+    def from_env(cls):
+        """
+        LOGIN_LIMIT=0 désactive. LOGIN_IP_PER_MIN (30) / LOGIN_IP_BURST (30) par adresse,
+        LOGIN_USER_PER_MIN (10) / LOGIN_USER_BURST (10) par identifiant,
+        LOGIN_LIMIT_MAX_KEYS (100000) seaux au plus par catégorie.
+        """
+        env = os.environ.get
+        max_keys = int(env("LOGIN_LIMIT_MAX_KEYS", "100000"))
+        return cls(
+            TokenBucket(float(env("LOGIN_IP_PER_MIN", "30")) / 60, float(env("LOGIN_IP_BURST", "30")),
+                        max_keys=max_keys, name="ip"),
+            TokenBucket(float(env("LOGIN_USER_PER_MIN", "10")) / 60, float(env("LOGIN_USER_BURST", "10")),
+                        max_keys=max_keys, name="user"),
+            enabled=env("LOGIN_LIMIT", "1") != "0",
+        )
+
+    def check(self, ip, username=None):
+        """0 si la tentative est permise, sinon le délai d'attente conseillé (secondes)."""
+        if not self.enabled:
+            return 0.0
+        wait = self.per_ip.take(ip or "-")
+        if wait:
+            metrics.inc("login_throttled_total", "Tentatives de connexion refusées (429)", scope="ip")
+            return wait
+        if username:
+            wait = self.per_user.take(username)
+            if wait:
+                metrics.inc("login_throttled_total", "Tentatives de connexion refusées (429)", scope="user")
+                return wait
+        return 0.0
+
+
+# partagé par app.py et panel_admin.py (même processus avec run_all)
+LOGIN_LIMITER = LoginLimiter.from_env()
+
+
+def too_many_requests(wait):
+    """Réponse 429 minimale (aucun rendu de template)."""
+    from flask import Response
+
+    return Response("Trop de tentatives, réessayez plus tard.\n", status=429, mimetype="text/plain",
+                    headers={"Retry-After": str(max(1, int(wait + 0.999)))})
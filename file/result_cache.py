@@ -0,0 +1,66 @@
+# Cache LRU borné avec durée de vie, pour les résultats de /search.
+# Clé : (mode, requête normalisée, version du CSV) ; valeur : indices des lignes trouvées.
+# Les recherches répétées (mêmes identifiants de classe toute la journée) ne refont pas
+# le parcours du CSV. Le cache est vidé à chaque rechargement du CSV (RosterEngine) ; la
+# version dans la clé garantit en plus qu'aucun résultat d'un ancien CSV n'est servi.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from file import metrics
+
+
+class ResultCache:
+    def __init__(self, maxsize=256, ttl=300.0, max_items=100000, name="search_results"):
+        """
+        maxsize : nombre d'entrées (0 désactive le cache) ; ttl : secondes (0 = sans limite) ;
+        max_items : les résultats plus longs ne sont pas gardés (mémoire bornée).
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_items = max_items
+        self.name = name
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # clé -> (expiration, valeur), du moins au plus récent
+
+    @classmethod
+    def from_env(cls):
+        """SEARCH_CACHE_SIZE (256), SEARCH_CACHE_TTL (300 s), SEARCH_CACHE_MAX_ROWS (100000)."""
+        return cls(
+            maxsize=int(os.environ.get("SEARCH_CACHE_SIZE", "256")),
+            ttl=float(os.environ.get("SEARCH_CACHE_TTL", "300")),
+            max_items=int(os.environ.get("SEARCH_CACHE_MAX_ROWS", "100000")),
+        )
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        if self.maxsize <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl and entry[0] < now:
+                del self._data[key]
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+        metrics.record_cache(self.name, entry is not None)
+        return None if entry is None else entry[1]
+
+    def put(self, key, value):
+        if self.maxsize <= 0 or len(value) > self.max_items:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,431 @@
+# Moteur de recherche en mémoire pour le CSV des identifiants (csv/all.csv, csv/all_vrai.csv).
+# Le CSV est lu une seule fois puis conservé sous forme de colonnes compactes avec :
+#   - une seule chaîne de recherche (toutes les lignes concaténées) et un tableau des
+#     positions de début de ligne pour la recherche partielle : un str.find parcourt tout
+#     le CSV en C, la ligne d'une occurrence est retrouvée par bisect sur les positions ;
+#   - les mêmes en minuscules (mode débridé) et une version sans accents ni casse des
+#     colonnes nom et identifiant (option "fold"), calculées une fois au chargement ;
+#   - pour les grandes listes, un index de trigrammes (file/trigram_index.py) qui réduit
+#     la recherche partielle à quelques lignes candidates ;
+#   - un index de préfixes trié (identifiants et noms, sans accents ni casse) pour les
+#     suggestions pendant la saisie, construit au premier usage.
+# Les résultats complets d'une recherche (indices de lignes) sont gardés dans un cache LRU
+# (file/result_cache.py) : le nombre de résultats et chaque page en sont tirés sans refaire
+# le parcours.
+# Les modifications du fichier sont détectées en arrière-plan (voir RosterEngine).
+
+import bisect
+import csv
+import hashlib
+import itertools
+import os
+import threading
+import unicodedata
+from array import array
+
+from file import metrics
+from file.file_watch import PollingWatcher, stat_signature
+from file.result_cache import ResultCache
+from file.trigram_index import TrigramIndex, enabled_for
+
+# Colonnes du CSV renvoyées par /search : classe, nom prénom, identifiant, mot de passe
+COL_CLASSE = 0
+COL_NOM = 1
+COL_ID = 4
+COL_PASSWORD = 5
+
+# Séparateur entre cellules dans les chaînes de recherche : une requête ne peut donc
+# jamais "déborder" d'une cellule sur la suivante. Sert aussi de fin de ligne dans les
+# chaînes concaténées.
+CELL_SEP = "\x00"
+
+# ligatures que NFKD ne décompose pas
+_FOLD_EXTRA = str.maketrans({"œ": "oe", "æ": "ae", "ø": "o", "đ": "d", "ł": "l"})
+
+
+def _cell(row, i):
+    return row[i] if len(row) > i else ""
+
+
+def fold(text):
+    """Forme de comparaison sans accents ni casse ("Lefèvre Zoé" -> "lefevre zoe")."""
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize("NFKD", text.casefold()).translate(_FOLD_EXTRA)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+class _Blob:
+    """Chaînes de lignes concaténées (chacune suivie de CELL_SEP) + positions de début de ligne."""
+
+    __slots__ = ("text", "offsets")
+
+    @classmethod
+    def mapped(cls, text, offsets):
+        """
+        Même interface sur un texte déjà encodé (bytes, mmap) et ses positions en octets ;
+        les aiguilles passées à iter_rows/verify sont alors des bytes.
+        """
+        blob = cls.__new__(cls)
+        blob.text = text
+        blob.offsets = offsets
+        return blob
+
+    def __init__(self, parts):
+        offsets = []
+        pos = 0
+        for part in parts:
+            offsets.append(pos)
+            pos += len(part) + 1
+        offsets.append(pos)  # sentinelle : fin du texte
+        self.offsets = array("I" if pos < 2 ** 32 else "Q", offsets)
+        self.text = CELL_SEP.join(parts) + CELL_SEP if parts else ""
+
+    def iter_rows(self, needle, start=0):
+        """Indices des lignes contenant needle, dans l'ordre, à partir de la ligne `start`."""
+        offsets = self.offsets
+        last = len(offsets) - 1
+        if start >= last:
+            return
+        find = self.text.find
+        pos = offsets[start]
+        end = offsets[last]
+        while True:
+            pos = find(needle, pos, end)
+            if pos < 0:
+                return
+            i = bisect.bisect_right(offsets, pos) - 1
+            if i >= last:
+                return
+            yield i
+            pos = offsets[i + 1]  # une seule fois par ligne
+
+    def verify(self, needle, rows):
+        """Parmi `rows` (triées), celles qui contiennent réellement needle."""
+        offsets = self.offsets
+        find = self.text.find
+        for i in rows:
+            if find(needle, offsets[i], offsets[i + 1]) >= 0:
+                yield i
+
+
+class RosterSnapshot:
+    """
+    Vue figée (lecture seule) d'un CSV de liste d'élèves.
+    Ne jamais modifier une instance publiée : les requêtes en cours la lisent sans verrou.
+    """
+
+    def __init__(self, rows, source=None, trigram=None):
+        self.source = source
+        self.classes = []
+        self.names = []
+        self.ids = []
+        self.passwords = []
+
+        joined_rows = []
+        folded_rows = []
+        for row in rows:
+            if not row:
+                continue
+            i = len(self.ids)
+            self.classes.append(_cell(row, COL_CLASSE))
+            self.names.append(_cell(row, COL_NOM))
+            self.ids.append(_cell(row, COL_ID))
+            self.passwords.append(_cell(row, COL_PASSWORD))
+            joined_rows.append(CELL_SEP.join(str(c) for c in row))
+            folded_rows.append(fold(self.names[i]) + CELL_SEP + fold(self.ids[i]))
+        # lower() peut changer la longueur d'une chaîne : chaque forme a ses propres positions
+        lower_rows = [r.lower() for r in joined_rows]
+        self._blob = _Blob(joined_rows)            # sensible à la casse (mode normal)
+        self._blob_lower = _Blob(lower_rows)       # minuscules (mode débridé)
+        self._blob_folded = _Blob(folded_rows)     # nom + identifiant, option fold
+        # empreinte du contenu servi : identique dans tous les workers et d'un rechargement
+        # à l'autre tant que le CSV ne change pas (ETag de /search, curseurs de pagination)
+        self.digest = hashlib.blake2b(self._blob.text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+        self.version = int(self.digest[:12], 16)
+        # trigram=None : selon ROSTER_TRIGRAM_INDEX / la taille de la liste
+        if trigram is None:
+            trigram = enabled_for(len(lower_rows))
+        self._trigrams = TrigramIndex(lower_rows, CELL_SEP) if trigram else None
+        self._prefix = None  # (clés triées, lignes) -- voir suggest()
+        self.cache = None    # ResultCache partagé, affecté par RosterEngine à la publication
+        self._prefix_lock = threading.Lock()
+
+    @classmethod
+    def from_csv(cls, path):
+        """Charge un CSV (en-tête ignoré). Un fichier absent donne une liste vide."""
+        if not os.path.exists(path):
+            return cls([], source=path)
+        with open(path, newline="", encoding="utf-8") as cf:
+            reader = csv.reader(cf)
+            _ = next(reader, None)
+            return cls(reader, source=path)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row(self, i):
+        """Ligne au format de la réponse JSON : [classe, nom prénom, id, password]."""
+        return [self.classes[i], self.names[i], self.ids[i], self.passwords[i]]
+
+    def rows(self, ids):
+        """Lignes des indices `ids`, dans le même ordre."""
+        return [self.row(i) for i in ids]
+
+    def iter_match_ids(self, q, debride=False, start=0, folded=False):
+        """
+        Indices (dans l'ordre du fichier, à partir de la ligne `start`) des lignes dont au
+        moins une cellule contient q. Générateur : l'appelant peut s'arrêter dès qu'il a
+        assez de résultats.
+        - mode normal : sensible à la casse (une ligne dont l'identifiant vaut exactement q
+          contient forcément q).
+        - mode débridé : insensible à la casse (comparaison sur les cellules en minuscules).
+        - folded=True : sans accents ni casse, sur les colonnes nom et identifiant seulement
+          (quel que soit le mode).
+        Avec l'index de trigrammes, seules les lignes candidates sont comparées. Il est
+        construit sur les minuscules : en mode normal, q in ligne implique q.lower() in
+        ligne.lower(), sauf pour le sigma final grec ("Σ" -> "ς" ou "σ" selon le
+        contexte), d'où le parcours complet dans ce cas.
+        """
+        if CELL_SEP in q:
+            return
+        needle = self._needle
+        if self._trigrams is not None and not folded and (debride or "Σ" not in q):
+            q_low = q.lower()
+            candidates = self._trigrams.candidates(q_low, start)
+            if candidates is not None:
+                if debride:
+                    yield from self._blob_lower.verify(needle(q_low), candidates)
+                else:
+                    yield from self._blob.verify(needle(q), candidates)
+                return
+        if folded:
+            yield from self._blob_folded.iter_rows(needle(fold(q)), start)
+        elif debride:
+            yield from self._blob_lower.iter_rows(needle(q.lower()), start)
+        else:
+            yield from self._blob.iter_rows(needle(q), start)
+
+    @staticmethod
+    def _needle(text):
+        """Aiguille au format des textes concaténés (str ici, octets UTF-8 pour roster_mmap)."""
+        return text
+
+    def cache_key(self, q, debride=False, folded=False):
+        """(mode, requête normalisée, version) : deux requêtes de même clé ont les mêmes résultats."""
+        if folded:
+            return ("fold", fold(q), self.version)
+        if debride:
+            return ("debride", q.lower(), self.version)
+        return ("normal", q, self.version)
+
+    def matches(self, q, debride=False, folded=False):
+        """Indices de toutes les lignes correspondantes (array('I') trié, à ne pas modifier)."""
+        cache = self.cache
+        key = None
+        if cache is not None:
+            key = self.cache_key(q, debride=debride, folded=folded)
+            ids = cache.get(key)
+            if ids is not None:
+                return ids
+        ids = array("I", self.iter_match_ids(q, debride=debride, folded=folded))
+        if cache is not None:
+            cache.put(key, ids)
+        return ids
+
+    def match_ids(self, q, debride=False, folded=False):
+        return list(self.matches(q, debride=debride, folded=folded))
+
+    def count_matches(self, q, debride=False, folded=False):
+        """Nombre total de lignes correspondantes, sans construire les lignes de résultat."""
+        return len(self.matches(q, debride=debride, folded=folded))
+
+    def page(self, q, debride=False, start=0, limit=500, folded=False, count=True):
+        """
+        Jusqu'à `limit` lignes correspondantes à partir de la ligne `start`, en un seul
+        parcours au plus. Renvoie (lignes, indice de la ligne suivante ou None, nombre total
+        de correspondances).
+        - résultat en cache : page et nombre en sont tirés, sans parcours ;
+        - sinon, count=True : un parcours complet compte les correspondances, garde la page
+          et remplit le cache si le résultat n'est pas trop long ;
+        - sinon, count=False (nombre déjà connu, page suivante) : parcours à partir de
+          `start`, arrêté dès que la page est pleine ; le nombre renvoyé est None.
+        """
+        cache = self.cache
+        key = None
+        if cache is not None:
+            key = self.cache_key(q, debride=debride, folded=folded)
+            ids = cache.get(key)
+            if ids is not None:
+                j = bisect.bisect_left(ids, start)
+                chunk = ids[j:j + limit + 1]
+                return self.rows(chunk[:limit]), (chunk[limit] if len(chunk) > limit else None), len(ids)
+        if not count:
+            chunk = list(itertools.islice(self.iter_match_ids(q, debride=debride, start=start, folded=folded), limit + 1))
+            return self.rows(chunk[:limit]), (chunk[limit] if len(chunk) > limit else None), None
+        keep = array("I") if cache is not None and cache.maxsize > 0 else None
+        chunk = []
+        total = 0
+        for i in self.iter_match_ids(q, debride=debride, folded=folded):
+            total += 1
+            if keep is not None:
+                keep.append(i)
+                if len(keep) > cache.max_items:
+                    keep = None  # trop long pour le cache : on ne fait plus que compter
+            if i >= start and len(chunk) <= limit:
+                chunk.append(i)
+        if keep is not None:
+            cache.put(key, keep)
+        return self.rows(chunk[:limit]), (chunk[limit] if len(chunk) > limit else None), total
+
+    def search(self, q, debride=False, limit=None, folded=False):
+        """Lignes correspondantes au format de la réponse JSON (au plus `limit` si précisé)."""
+        ids = self.matches(q, debride=debride, folded=folded)
+        if limit is not None:
+            ids = ids[:limit]
+        return self.rows(ids)
+
+    def _prefix_index(self):
+        index = self._prefix
+        if index is None:
+            with self._prefix_lock:
+                index = self._prefix
+                if index is None:
+                    pairs = [(fold(v), i) for col in (self.ids, self.names) for i, v in enumerate(col) if v]
+                    pairs.sort()
+                    index = self._prefix = ([k for k, _ in pairs], array("I", [i for _, i in pairs]))
+        return index
+
+    def suggest(self, prefix, k=10):
+        """
+        Jusqu'à k lignes dont l'identifiant ou le nom commence par prefix (sans accents ni
+        casse), dans l'ordre alphabétique des clés. Renvoie [classe, nom prénom, id] : pas
+        de mot de passe dans les suggestions.
+        """
+        p = fold(prefix)
+        if not p or k <= 0:
+            return []
+        keys, rows = self._prefix_index()
+        out = []
+        seen = set()
+        for j in range(bisect.bisect_left(keys, p), len(keys)):
+            if not keys[j].startswith(p):
+                break
+            i = rows[j]
+            if i in seen:
+                continue
+            seen.add(i)
+            out.append(self.row(i)[:3])
+            if len(out) == k:
+                break
+        return out
+
+
+def load_snapshot(path):
+    """
+    Snapshot du CSV `path` selon ROSTER_BACKEND :
+    - memory (défaut) : snapshot binaire précompilé (generateur/build_roster_snapshot.py)
+      s'il existe et correspond encore au CSV, sinon CSV chargé en mémoire ;
+      ROSTER_SNAPSHOT=0 ignore le snapshot binaire ;
+    - sqlite : file/roster_sqlite.py ;
+    - mmap : snapshot binaire, reconstruit automatiquement quand le CSV change.
+    """
+    backend = os.environ.get("ROSTER_BACKEND", "memory").strip().lower()
+    if backend in ("", "memory"):
+        if os.environ.get("ROSTER_SNAPSHOT", "1") != "0":
+            from file.roster_mmap import MappedRoster
+
+            snap = MappedRoster.open_prebuilt(path)
+            if snap is not None:
+                return snap
+        return RosterSnapshot.from_csv(path)
+    if backend == "sqlite":
+        from file.roster_sqlite import SQLiteRoster
+
+        return SQLiteRoster.from_csv(path)
+    if backend == "mmap":
+        from file.roster_mmap import MappedRoster
+
+        return MappedRoster.from_csv(path)
+    raise ValueError(f"ROSTER_BACKEND inconnu : {backend!r} (memory, sqlite ou mmap)")
+
+
+class RosterEngine:
+    """
+    Point d'accès partagé au CSV : toutes les recherches sont servies depuis le
+    RosterSnapshot publié, sans accès disque.
+    Un PollingWatcher surveille le fichier (inode/taille/mtime) ; en cas de changement,
+    le nouveau snapshot est construit dans le thread de surveillance puis publié par une
+    seule affectation de référence : une recherche en cours garde l'ancien snapshot
+    complet, la suivante voit le nouveau.
+
+    `path` peut être un chemin ou une fonction renvoyant le chemin courant (permet de
+    basculer entre all.csv et all_vrai.csv sans redémarrer).
+    """
+
+    def __init__(self, path, poll_interval=2.0, watcher=None, cache=None):
+        self._path = path
+        self.cache = cache if cache is not None else ResultCache.from_env()
+        self._lock = threading.Lock()
+        # état publié : (chemin, signature, snapshot) -- remplacé d'un bloc, jamais modifié
+        self._state = None
+        self._pending = None  # (chemin, signature) vus au sondage précédent
+        self.watcher = watcher or PollingWatcher(interval=poll_interval, name="roster-watch")
+        self.watcher.add(self.refresh)
+
+    @property
+    def path(self):
+        return self._path() if callable(self._path) else self._path
+
+    def snapshot(self):
+        state = self._state
+        if state is None:
+            # premier accès uniquement (préférer load() au démarrage)
+            with self._lock:
+                if self._state is None:
+                    path = self.path
+                    self._publish(path, stat_signature(path))
+                state = self._state
+        self.watcher.ensure_started()
+        return state[2]
+
+    def load(self):
+        """Chargement synchrone (démarrage, ou forcé). Renvoie l'état publié."""
+        with self._lock:
+            path = self.path
+            self._publish(path, stat_signature(path))
+            return self._state
+
+    def _publish(self, path, signature):
+        metrics.record_file_read("roster")
+        with metrics.timed("roster_load_seconds", "Durée de chargement du CSV"):
+            snap = load_snapshot(path)
+        snap.cache = self.cache
+        self.cache.clear()
+        self._state = (path, signature, snap)
+        self._pending = None
+
+    def refresh(self):
+        """
+        Appelé par le thread de surveillance. Recharge si le fichier (ou le chemin) a
+        changé et que sa signature est stable depuis le sondage précédent : un fichier
+        en cours de réécriture sur place (gen_password_csv.py) n'est pas chargé à moitié.
+        Renvoie True si un nouveau snapshot a été publié.
+        """
+        state = self._state
+        if state is None:
+            return False
+        path = self.path
+        signature = stat_signature(path)
+        if (path, signature) == state[:2]:
+            self._pending = None
+            return False
+        if self._pending != (path, signature):
+            self._pending = (path, signature)
+            return False
+        with self._lock:
+            self._publish(path, signature)
+        return True
+
+    def search(self, q, debride=False, folded=False):
+        return self.snapshot().search(q, debride=debride, folded=folded)
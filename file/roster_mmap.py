@@ -0,0 +1,335 @@
+# Snapshot binaire du CSV des identifiants, lu par projection mémoire (mmap).
+# Le CSV est compilé en un fichier data/<nom du csv>.roster :
+#   - par generateur/build_roster_snapshot.py (étape de construction) : app.py l'ouvre alors
+#     au démarrage en quelques millisecondes au lieu de parser le CSV, et revient au CSV si
+#     le snapshot ne correspond plus au fichier source ;
+#   - ou automatiquement avec ROSTER_BACKEND=mmap (reconstruit dès que le CSV change).
+# Le fichier est ouvert avec mmap en lecture seule : ses pages sont dans le cache du
+# système, partagées par tous les workers, et chaque processus ne garde en Python que des
+# vues (memoryview) sur ce fichier. Les cellules d'une ligne ne sont décodées que
+# lorsqu'elle est renvoyée ; la mémoire propre d'un worker ne dépend plus de la taille de
+# la liste.
+#
+# Format (octets, ordre natif de la machine) :
+#   - en-tête de HEADER_SIZE octets : MAGIC, FORMAT_VERSION, longueur puis JSON (nombre de
+#     lignes, empreinte, fichier source : taille, mtime, hash ; table des sections) ;
+#   - sections alignées sur 8 octets, aux positions données par la table :
+#       text / lower / folded : table des chaînes, lignes concaténées en UTF-8 (cellules
+#         séparées par \x00, chaque ligne suivie de \x00), telles quelles, en minuscules, et
+#         nom + identifiant sans accents ni casse -- les mêmes chaînes que RosterSnapshot ;
+#       text_offsets / lower_offsets / folded_offsets : position (dans le fichier) du début
+#         de chaque ligne, plus la fin du texte (uint64) ;
+#       prefix_keys / prefix_key_offsets / prefix_rows : clés de suggestion triées
+#         (identifiants et noms sans accents ni casse) et ligne de chaque clé ;
+#       trigram_keys / trigram_key_offsets / trigram_bounds / trigram_rows (optionnel) : index
+#         de trigrammes (file/trigram_index.py), trigrammes triés et listes de lignes.
+# Une sous-chaîne en octets UTF-8 est une sous-chaîne en caractères : la recherche se fait
+# directement sur les octets (mmap.find), comme str.find sur les chaînes en mémoire.
+# Le fichier est écrit dans un fichier temporaire puis remplacé atomiquement ; un
+# snapshot déjà publié garde sa projection de l'ancien fichier.
+
+import bisect
+import csv
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from file import metrics
+from file.roster_engine import (
+    CELL_SEP, COL_CLASSE, COL_ID, COL_NOM, COL_PASSWORD, RosterSnapshot, _Blob, _cell, fold,
+)
+from file.trigram_index import TrigramIndex, enabled_for
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAGIC = b"WMROSTER"
+FORMAT_VERSION = 2
+HEADER_SIZE = 4096
+_HEADER = struct.Struct("<8sII")  # magic, version, longueur du JSON
+_SEP = CELL_SEP.encode()
+
+
+def mapped_path_for(csv_path):
+    """data/all_vrai.csv.roster pour csv/all_vrai.csv (ROSTER_MMAP_DIR pour changer de dossier)."""
+    directory = os.environ.get("ROSTER_MMAP_DIR") or os.path.join(BASE_DIR, "data")
+    return os.path.join(directory, os.path.basename(str(csv_path)) + ".roster")
+
+
+def _encode(text):
+    return text.encode("utf-8", "surrogatepass")
+
+
+def _decode(data):
+    return data.decode("utf-8", "surrogatepass")
+
+
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _joined(parts):
+    """(texte encodé, positions relatives de début de ligne + fin) -- comme _Blob, en octets."""
+    offsets = array("Q")
+    pos = 0
+    for part in parts:
+        offsets.append(pos)
+        pos += len(part) + 1
+    offsets.append(pos)
+    return (_SEP.join(parts) + _SEP if parts else b""), offsets
+
+
+def write_mapped(csv_path, out_path, trigram=None):
+    """
+    Compile le CSV (en-tête ignoré) au format ci-dessus et remplace out_path atomiquement.
+    trigram=None : index de trigrammes selon ROSTER_TRIGRAM_INDEX / la taille de la liste.
+    """
+    st = os.stat(csv_path)
+    source_hash = file_hash(csv_path)
+    text_rows, lower_rows, folded_rows = [], [], []
+    ids, names = [], []
+    with open(csv_path, newline="", encoding="utf-8") as cf:
+        reader = csv.reader(cf)
+        next(reader, None)
+        for row in reader:
+            if not row:
+                continue
+            joined = CELL_SEP.join(str(c) for c in row)
+            name, ident = _cell(row, COL_NOM), _cell(row, COL_ID)
+            text_rows.append(joined)
+            lower_rows.append(joined.lower())
+            folded_rows.append(_encode(fold(name) + CELL_SEP + fold(ident)))
+            ids.append(ident)
+            names.append(name)
+    pairs = sorted((fold(v), i) for col in (ids, names) for i, v in enumerate(col) if v)
+    if trigram is None:
+        trigram = enabled_for(len(lower_rows))
+    trigrams = TrigramIndex(lower_rows, CELL_SEP).items() if trigram else None
+
+    # textes, avec leurs positions de début de ligne (rendues absolues une fois la place de
+    # chaque texte connue)
+    texts = {
+        "text": _joined([_encode(r) for r in text_rows]),
+        "lower": _joined([_encode(r) for r in lower_rows]),
+        "folded": _joined(folded_rows),
+        "prefix_keys": _joined([_encode(k) for k, _ in pairs]),
+    }
+    del text_rows, lower_rows, folded_rows
+    sections = [(name, texts[name][0]) for name in texts]
+    sections += [("prefix_key_offsets" if name == "prefix_keys" else name + "_offsets", texts[name][1])
+                 for name in texts]
+    sections.append(("prefix_rows", array("I", (i for _, i in pairs))))
+    if trigrams is not None:
+        keys, key_offsets = _joined([_encode(g) for g, _ in trigrams])
+        bounds = array("Q", [0])
+        rows = array("I")
+        for _, lst in trigrams:
+            rows.extend(lst)
+            bounds.append(len(rows))
+        texts["trigram_keys"] = (keys, key_offsets)
+        sections += [("trigram_keys", keys), ("trigram_key_offsets", key_offsets),
+                     ("trigram_bounds", bounds), ("trigram_rows", rows)]
+
+    layout = {}
+    pos = HEADER_SIZE
+    for name, content in sections:
+        size = len(content) * content.itemsize if isinstance(content, array) else len(content)
+        layout[name] = [pos, size, content.typecode if isinstance(content, array) else "B"]
+        pos += size + (-size % 8)
+    for name, (_, offsets) in texts.items():
+        base = layout[name][0]
+        for j in range(len(offsets)):
+            offsets[j] += base
+
+    meta = {
+        "rows": len(ids),
+        "digest": hashlib.blake2b(texts["text"][0], digest_size=16).hexdigest(),
+        "source": os.path.abspath(str(csv_path)),
+        "source_size": st.st_size,
+        "source_mtime_ns": st.st_mtime_ns,
+        "source_hash": source_hash,
+        "byteorder": sys.byteorder,
+        "sections": layout,
+    }
+    header = json.dumps(meta, sort_keys=True).encode()
+    if _HEADER.size + len(header) > HEADER_SIZE:
+        raise ValueError("en-tête du fichier roster trop long")
+
+    directory = os.path.dirname(os.path.abspath(out_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".roster.tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            head = _HEADER.pack(MAGIC, FORMAT_VERSION, len(header)) + header
+            f.write(head + b"\x00" * (HEADER_SIZE - len(head)))
+            for _, content in sections:
+                data = content.tobytes() if isinstance(content, array) else content
+                f.write(data + b"\x00" * (-len(data) % 8))
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return meta
+
+
+def read_header(path):
+    """Métadonnées d'un fichier roster (None si absent, illisible ou d'une autre version)."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(HEADER_SIZE)
+    except OSError:
+        return None
+    if len(head) < _HEADER.size:
+        return None
+    magic, version, length = _HEADER.unpack_from(head)
+    if magic != MAGIC or version != FORMAT_VERSION or _HEADER.size + length > len(head):
+        return None
+    try:
+        meta = json.loads(head[_HEADER.size:_HEADER.size + length])
+    except ValueError:
+        return None
+    return meta if meta.get("byteorder") == sys.byteorder else None
+
+
+def is_fresh(meta, csv_path):
+    """
+    Le snapshot correspond-il encore au CSV ? Même taille et même mtime : oui ; même taille
+    mais autre mtime (fichier recopié, touché) : comparaison du hash du contenu.
+    """
+    try:
+        st = os.stat(csv_path)
+    except OSError:
+        return False
+    if meta is None or st.st_size != meta["source_size"]:
+        return False
+    if st.st_mtime_ns == meta["source_mtime_ns"]:
+        return True
+    return file_hash(csv_path) == meta["source_hash"]
+
+
+class _Keys:
+    """Séquence de clés triées, décodées à la demande (pour bisect)."""
+
+    __slots__ = ("buf", "offsets")
+
+    def __init__(self, buf, offsets):
+        self.buf = buf
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, j):
+        return _decode(self.buf[self.offsets[j]:self.offsets[j + 1] - 1])
+
+
+class _Postings:
+    """Listes de l'index de trigrammes dans le fichier (interface get() d'un dict)."""
+
+    __slots__ = ("keys", "bounds", "rows")
+
+    def __init__(self, keys, bounds, rows):
+        self.keys = keys
+        self.bounds = bounds
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, gram):
+        keys = self.keys
+        j = bisect.bisect_left(keys, gram)
+        if j < len(keys) and keys[j] == gram:
+            return self.rows[self.bounds[j]:self.bounds[j + 1]]
+        return None
+
+
+class MappedRoster(RosterSnapshot):
+    """Même interface que RosterSnapshot, servie depuis un fichier roster projeté en mémoire."""
+
+    def __init__(self, path, source=None):
+        meta = read_header(path)
+        if meta is None:
+            raise ValueError(f"fichier roster invalide : {path}")
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mm)
+        sections = meta["sections"]
+
+        def section(name):
+            offset, length, typecode = sections[name]
+            return view[offset:offset + length].cast(typecode)
+
+        self.path = path
+        self.source = source
+        self.meta = meta
+        self._count = meta["rows"]
+        self._blob = _Blob.mapped(self._mm, section("text_offsets"))
+        self._blob_lower = _Blob.mapped(self._mm, section("lower_offsets"))
+        self._blob_folded = _Blob.mapped(self._mm, section("folded_offsets"))
+        self._prefix = (_Keys(self._mm, section("prefix_key_offsets")), section("prefix_rows"))
+        self._trigrams = None
+        if "trigram_keys" in sections:
+            self._trigrams = TrigramIndex.mapped(_Postings(
+                _Keys(self._mm, section("trigram_key_offsets")), section("trigram_bounds"), section("trigram_rows")))
+        self.digest = meta["digest"]
+        self.version = int(self.digest[:12], 16)
+        self.cache = None
+
+    @classmethod
+    def open_prebuilt(cls, path):
+        """Snapshot construit pour le CSV `path` s'il est à jour, sinon None (lire le CSV)."""
+        mapped = mapped_path_for(path)
+        meta = read_header(mapped)
+        if meta is None:
+            return None
+        if not is_fresh(meta, path):
+            metrics.inc("roster_snapshot_stale_total", "Snapshots binaires ignorés (CSV modifié depuis)")
+            return None
+        return cls(mapped, source=path)
+
+    @classmethod
+    def from_csv(cls, path):
+        """Ouvre le snapshot du CSV, en le (re)construisant s'il ne correspond plus au CSV."""
+        if not os.path.exists(path):
+            return RosterSnapshot([], source=path)
+        mapped = mapped_path_for(path)
+        if not is_fresh(read_header(mapped), path):
+            os.makedirs(os.path.dirname(os.path.abspath(mapped)), exist_ok=True)
+            with open(mapped + ".lock", "a") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                # un autre worker a pu le reconstruire pendant l'attente du verrou
+                if not is_fresh(read_header(mapped), path):
+                    write_mapped(path, mapped)
+        return cls(mapped, source=path)
+
+    def __len__(self):
+        return self._count
+
+    def _cells(self, i):
+        offsets = self._blob.offsets
+        return _decode(self._mm[offsets[i]:offsets[i + 1] - 1]).split(CELL_SEP)
+
+    def row(self, i):
+        cells = self._cells(i)
+        return [_cell(cells, COL_CLASSE), _cell(cells, COL_NOM), _cell(cells, COL_ID), _cell(cells, COL_PASSWORD)]
+
+    @staticmethod
+    def _needle(text):
+        return _encode(text)
+
+    def _prefix_index(self):
+        return self._prefix
@@ -0,0 +1,277 @@
+# Stockage SQLite du CSV des identifiants (option ROSTER_BACKEND=sqlite).
+# Le CSV reste le format d'import : à chaque changement du fichier (signature inode/taille/
+# mtime), il est importé dans une nouvelle base data/<nom du csv>.<empreinte>.sqlite3
+# (construite dans un fichier temporaire puis renommée), sous un verrou de fichier : un
+# seul worker importe, les autres attendent puis ouvrent la base qu'il a produite.
+# Une base n'est jamais modifiée après son import : chaque snapshot ouvre uniquement le
+# fichier de sa propre empreinte, même depuis un nouveau thread après un réimport ; les
+# deux versions les plus récentes sont conservées, les plus anciennes sont supprimées.
+# Les requêtes lisent la base sans la charger en mémoire : seules les lignes demandées
+# sont décodées, la taille de la liste n'est plus limitée par la RAM des workers.
+#
+# Table rows : idx (position dans le CSV, clé primaire), les quatre colonnes renvoyées,
+# les cellules jointes (BLOB UTF-8, séparateur \x00, telles quelles et en minuscules) et
+# les formes sans accents ni casse du nom et de l'identifiant (option fold, suggestions).
+#   - table FTS5 (tokenizer trigram) sur les cellules en minuscules : préfiltre des
+#     recherches de 3 caractères ou plus, le résultat est toujours vérifié par instr() sur
+#     les cellules exactes, il est donc identique à celui de RosterSnapshot.
+# instr() sur des BLOB compare les octets UTF-8 : une sous-chaîne en octets est une
+# sous-chaîne en caractères, et le séparateur \x00 n'interrompt pas la comparaison.
+
+import csv
+import glob
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+
+from file.file_watch import stat_signature
+from file.roster_engine import (
+    CELL_SEP, COL_CLASSE, COL_ID, COL_NOM, COL_PASSWORD, RosterSnapshot, _cell, fold,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_VERSION = "1"
+KEEP_VERSIONS = 2  # bases conservées par CSV (la courante et la précédente)
+
+# séparateur du texte indexé par FTS5 (le tokenizer s'arrête aux \x00)
+_FTS_SEP = "\x1f"
+
+
+def _db_prefix(csv_path):
+    """data/all_vrai.csv pour csv/all_vrai.csv (ROSTER_SQLITE_DIR pour changer de dossier)."""
+    directory = os.environ.get("ROSTER_SQLITE_DIR") or os.path.join(BASE_DIR, "data")
+    return os.path.join(directory, os.path.basename(str(csv_path)))
+
+
+def db_path_for(csv_path, digest):
+    """data/all_vrai.csv.<empreinte>.sqlite3 : base du contenu d'empreinte `digest`."""
+    return f"{_db_prefix(csv_path)}.{digest[:16]}.sqlite3"
+
+
+def db_versions(csv_path):
+    """Bases importées pour ce CSV, de la plus récente à la plus ancienne."""
+    paths = glob.glob(glob.escape(_db_prefix(csv_path)) + ".*.sqlite3")
+    return sorted(paths, key=lambda p: os.stat(p).st_mtime_ns, reverse=True)
+
+
+def _signature_text(signature):
+    return "" if signature is None else ":".join(str(x) for x in signature)
+
+
+def read_meta(db_path):
+    """Métadonnées d'une base existante ({} si absente ou illisible)."""
+    if not os.path.exists(db_path):
+        return {}
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            return dict(conn.execute("SELECT key, value FROM meta"))
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return {}
+
+
+def import_csv(csv_path, signature=None):
+    """Importe le CSV (en-tête ignoré) dans une nouvelle base ; renvoie son chemin."""
+    signature = stat_signature(csv_path) if signature is None else signature
+    directory = os.path.dirname(os.path.abspath(_db_prefix(csv_path)))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".sqlite3.tmp")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(tmp_path, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("BEGIN")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE rows (idx INTEGER PRIMARY KEY, classe TEXT, nom TEXT, identifiant TEXT, password TEXT,"
+                " haystack BLOB, haystack_lower BLOB, fts TEXT, folded BLOB, nom_fold TEXT, id_fold TEXT)")
+            digest = hashlib.blake2b(digest_size=16)
+
+            def rows():
+                with open(csv_path, newline="", encoding="utf-8") as cf:
+                    reader = csv.reader(cf)
+                    next(reader, None)
+                    i = 0
+                    for row in reader:
+                        if not row:
+                            continue
+                        joined = CELL_SEP.join(str(c) for c in row)
+                        # même empreinte que RosterSnapshot (texte joint, chaque ligne suivie de CELL_SEP)
+                        digest.update((joined + CELL_SEP).encode("utf-8", "surrogatepass"))
+                        lower = joined.lower()
+                        nom, ident = _cell(row, COL_NOM), _cell(row, COL_ID)
+                        nom_fold, id_fold = fold(nom), fold(ident)
+                        yield (i, _cell(row, COL_CLASSE), nom, ident, _cell(row, COL_PASSWORD),
+                               joined.encode("utf-8", "surrogatepass"), lower.encode("utf-8", "surrogatepass"),
+                               lower.replace(CELL_SEP, _FTS_SEP),
+                               (nom_fold + CELL_SEP + id_fold).encode("utf-8", "surrogatepass"),
+                               nom_fold, id_fold)
+                        i += 1
+
+            conn.executemany("INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows())
+            conn.execute("CREATE INDEX rows_id_fold ON rows (id_fold, idx)")
+            conn.execute("CREATE INDEX rows_nom_fold ON rows (nom_fold, idx)")
+            conn.execute("CREATE VIRTUAL TABLE rows_fts USING fts5(fts, content='rows', content_rowid='idx',"
+                         " tokenize='trigram')")
+            conn.execute("INSERT INTO rows_fts (rows_fts) VALUES ('rebuild')")
+            count = conn.execute("SELECT count(*) FROM rows").fetchone()[0]
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("schema", SCHEMA_VERSION),
+                ("source", os.path.abspath(str(csv_path))),
+                ("signature", _signature_text(signature)),
+                ("digest", digest.hexdigest()),
+                ("rows", str(count)),
+            ])
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        db_path = db_path_for(csv_path, digest.hexdigest())
+        # contenu déjà importé (CSV seulement touché) : le fichier remplacé a les mêmes lignes
+        os.replace(tmp_path, db_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return db_path
+
+
+def _current_db(csv_path, signature):
+    """Base la plus récente si elle correspond à la signature actuelle du CSV, sinon None."""
+    versions = db_versions(csv_path)
+    if not versions:
+        return None
+    meta = read_meta(versions[0])
+    if meta.get("schema") != SCHEMA_VERSION or meta.get("signature") != _signature_text(signature):
+        return None
+    return versions[0]
+
+
+def _prune(csv_path):
+    for old in db_versions(csv_path)[KEEP_VERSIONS:]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+
+
+class SQLiteRoster(RosterSnapshot):
+    """
+    Même interface que RosterSnapshot, servie depuis la base SQLite.
+    La base (propre à l'empreinte du snapshot) n'est jamais modifiée : elle est ouverte en
+    lecture seule "immutable", sans verrouillage. Une connexion par thread ;
+    les requêtes sont des chaînes constantes, préparées une fois par connexion (cache de
+    requêtes du module sqlite3).
+    """
+
+    def __init__(self, db_path, source=None):
+        self.db_path = db_path
+        self.source = source
+        self.cache = None
+        self._local = threading.local()
+        meta = dict(self._conn().execute("SELECT key, value FROM meta"))
+        self.digest = meta["digest"]
+        self.version = int(self.digest[:12], 16)
+        self._count = int(meta["rows"])
+
+    @classmethod
+    def from_csv(cls, path):
+        """Ouvre la base du CSV, en la (ré)important si le CSV a changé depuis le dernier import."""
+        if not os.path.exists(path):
+            return RosterSnapshot([], source=path)
+        signature = stat_signature(path)
+        db_path = _current_db(path, signature)
+        if db_path is None:
+            lock_path = _db_prefix(path) + ".sqlite3.lock"
+            os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+            with open(lock_path, "a") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                # un autre worker a pu faire l'import pendant l'attente du verrou
+                db_path = _current_db(path, signature)
+                if db_path is None:
+                    db_path = import_csv(path, signature)
+                    _prune(path)
+        return cls(db_path, source=path)
+
+    def _conn(self):
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            # mode=ro : une base supprimée entre-temps donne une erreur, jamais une base vide
+            local.conn = sqlite3.connect(f"file:{self.db_path}?mode=ro&immutable=1", uri=True,
+                                         check_same_thread=False)
+            local.pid = os.getpid()
+        return local.conn
+
+    def __len__(self):
+        return self._count
+
+    def row(self, i):
+        r = self._conn().execute("SELECT classe, nom, identifiant, password FROM rows WHERE idx = ?", (i,)).fetchone()
+        return list(r)
+
+    def rows(self, ids):
+        ids = list(ids)
+        if not ids:
+            return []
+        found = {}
+        conn = self._conn()
+        # par lots : SQLite limite le nombre de paramètres d'une requête
+        for n in range(0, len(ids), 500):
+            part = ids[n:n + 500]
+            sql = f"SELECT idx, classe, nom, identifiant, password FROM rows WHERE idx IN ({','.join('?' * len(part))})"
+            for idx, *cells in conn.execute(sql, part):
+                found[idx] = cells
+        return [found[i] for i in ids]
+
+    def iter_match_ids(self, q, debride=False, start=0, folded=False):
+        if CELL_SEP in q:
+            return
+        conn = self._conn()
+        if folded:
+            cursor = conn.execute("SELECT idx FROM rows WHERE idx >= ? AND instr(folded, ?) > 0 ORDER BY idx",
+                                  (start, fold(q).encode("utf-8", "surrogatepass")))
+        else:
+            column = "haystack_lower" if debride else "haystack"
+            needle = (q.lower() if debride else q).encode("utf-8", "surrogatepass")
+            q_low = q.lower()
+            # même règle que l'index de trigrammes en mémoire (sigma final en mode normal)
+            if len(q_low) >= 3 and (debride or "Σ" not in q):
+                phrase = '"' + q_low.replace('"', '""') + '"'
+                cursor = conn.execute(
+                    f"SELECT idx FROM rows WHERE idx >= ? AND instr({column}, ?) > 0"
+                    " AND idx IN (SELECT rowid FROM rows_fts WHERE rows_fts MATCH ?) ORDER BY idx",
+                    (start, needle, phrase))
+            else:
+                cursor = conn.execute(f"SELECT idx FROM rows WHERE idx >= ? AND instr({column}, ?) > 0 ORDER BY idx",
+                                      (start, needle))
+        for (i,) in cursor:
+            yield i
+
+    def suggest(self, prefix, k=10):
+        p = fold(prefix)
+        if not p or k <= 0:
+            return []
+        hi = p + "\U0010ffff"
+        keys = self._conn().execute(
+            "SELECT key, idx FROM ("
+            " SELECT id_fold AS key, idx FROM rows WHERE id_fold >= ? AND id_fold < ? AND identifiant != ''"
+            " UNION ALL"
+            " SELECT nom_fold AS key, idx FROM rows WHERE nom_fold >= ? AND nom_fold < ? AND nom != ''"
+            ") ORDER BY key, idx LIMIT ?", (p, hi, p, hi, 2 * k))
+        ids = []
+        for _, i in keys:
+            if i not in ids:
+                ids.append(i)
+                if len(ids) == k:
+                    break
+        return [row[:3] for row in self.rows(ids)]
@@ -0,0 +1,226 @@
+# Sessions côté serveur pour app.py et panel_admin.py (option SESSION_BACKEND).
+# Le cookie ne contient qu'un identifiant opaque aléatoire ; le contenu de la session
+# (authed, username, debride, pass_ok, admin_user, messages flash...) reste sur le serveur :
+#   - "memory" : dictionnaire en mémoire avec durée de vie (un seul processus) ;
+#   - "sqlite" : fichier SQLite local, partagé par tous les workers d'une même machine.
+# Par défaut ("cookie"), Flask garde ses sessions signées dans le cookie.
+# La session n'est lue dans le store qu'au premier accès, et n'est écrite que si elle a
+# été modifiée. Vider la session (session.clear(), fait à chaque connexion) change son
+# identifiant : un identifiant connu avant la connexion ne donne accès à rien ensuite.
+
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+
+from file import metrics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SQLITE_PATH = os.path.join(BASE_DIR, "data", "sessions.sqlite3")
+DEFAULT_TTL = 12 * 3600  # secondes, pour les sessions non permanentes
+
+_SID_LENGTH = 43  # secrets.token_urlsafe(32)
+
+
+def _valid_sid(sid):
+    return bool(sid) and len(sid) == _SID_LENGTH and all(c.isalnum() or c in "-_" for c in sid)
+
+
+# ---------- stores ----------
+class MemoryStore:
+    """sid -> (expiration, données sérialisées), purgé périodiquement."""
+
+    def __init__(self, sweep_interval=60.0):
+        self._lock = threading.Lock()
+        self._data = {}
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.time() + sweep_interval
+
+    def get(self, sid):
+        now = time.time()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            entry = self._data.get(sid)
+            if entry is None or entry[0] < now:
+                return None
+            return entry[1]
+
+    def set(self, sid, data, ttl):
+        with self._lock:
+            self._data[sid] = (time.time() + ttl, data)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def _sweep(self, now):
+        for sid in [k for k, (expires, _) in self._data.items() if expires < now]:
+            del self._data[sid]
+        self._next_sweep = now + self.sweep_interval
+
+
+class SQLiteStore:
+    """Table sessions(sid, data, expires) ; une connexion par thread (et par processus)."""
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH, sweep_interval=300.0):
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._next_sweep = 0.0
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+
+    def _conn(self):
+        local = self._local
+        # après un fork, les connexions héritées ne doivent pas être réutilisées
+        if getattr(local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            local.conn = conn
+            local.pid = os.getpid()
+        return local.conn
+
+    def get(self, sid):
+        now = time.time()
+        conn = self._conn()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            conn.execute("DELETE FROM sessions WHERE expires < ?", (now,))
+        row = conn.execute("SELECT data FROM sessions WHERE sid = ? AND expires >= ?", (sid, now)).fetchone()
+        return None if row is None else row[0]
+
+    def set(self, sid, data, ttl):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)", (sid, data, time.time() + ttl))
+
+    def delete(self, sid):
+        self._conn().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+
+# ---------- session Flask ----------
+class ServerSession(SessionMixin):
+    """Session chargée depuis le store au premier accès ; `modified` suit les écritures."""
+
+    def __init__(self, store, serializer, sid=None):
+        self.store = store
+        self.serializer = serializer
+        self.sid = sid
+        self.rotate = False
+        self.modified = False
+        self.accessed = False
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self.accessed = True
+            raw = self.store.get(self.sid) if self.sid else None
+            metrics.record_cache("sessions", raw is not None)
+            self._data = {}
+            if raw is not None:
+                try:
+                    self._data = self.serializer.loads(raw)
+                except Exception:
+                    self._data = {}
+        return self._data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        if self.sid is not None:
+            self.rotate = True
+        self._data = {}
+        self.accessed = True
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, ttl=DEFAULT_TTL):
+        self.store = store
+        self.ttl = ttl
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        return ServerSession(self.store, self.serializer, sid if _valid_sid(sid) else None)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add("Cookie")
+        if not session.modified:
+            return
+        old_sid = session.sid
+        if session.rotate and old_sid:
+            self.store.delete(old_sid)
+            session.sid = None
+        if not session.data:
+            if old_sid:
+                if not session.rotate:
+                    self.store.delete(old_sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        expires = self.get_expiration_time(app, session)
+        ttl = (expires - datetime.now(timezone.utc)).total_seconds() if expires else self.ttl
+        self.store.set(session.sid, self.serializer.dumps(dict(session.data)), max(ttl, 1))
+        if session.sid != old_sid or session.permanent:
+            response.set_cookie(name, session.sid, expires=expires, httponly=self.get_cookie_httponly(app),
+                                domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+
+
+_interface = None
+_interface_lock = threading.Lock()
+
+
+def get_session_interface():
+    """
+    Interface partagée par les deux apps (None = sessions cookie de Flask).
+    SESSION_BACKEND=cookie|memory|sqlite, SESSION_SQLITE_PATH, SESSION_TTL (secondes).
+    """
+    global _interface
+    backend = os.environ.get("SESSION_BACKEND", "cookie").strip().lower()
+    if backend in ("", "cookie"):
+        return None
+    with _interface_lock:
+        if _interface is None:
+            ttl = float(os.environ.get("SESSION_TTL", str(DEFAULT_TTL)))
+            if backend == "sqlite":
+                store = SQLiteStore(os.environ.get("SESSION_SQLITE_PATH") or DEFAULT_SQLITE_PATH)
+            elif backend == "memory":
+                store = MemoryStore()
+            else:
+                raise ValueError(f"SESSION_BACKEND inconnu : {backend!r} (cookie, memory ou sqlite)")
+            _interface = ServerSessionInterface(store, ttl=ttl)
+        return _interface
@@ -0,0 +1,50 @@
+# Vérification TOTP avec codes précalculés par pas de 30 s.
+# pyotp.TOTP.verify(code, valid_window=1) calcule trois HMAC-SHA1 à chaque appel ; ici
+# les codes attendus (pas précédent, courant, suivant) sont calculés une fois par pas
+# puis la vérification est une simple recherche dans un ensemble.
+# Les entrées qui ne peuvent pas être un code (pas exactement `digits` chiffres ASCII)
+# sont rejetées sans aucun calcul.
+
+import time
+
+from file import metrics
+
+
+class CachedTOTP:
+    """Enveloppe un pyotp.TOTP ; les autres attributs (now, provisioning_uri...) sont délégués."""
+
+    def __init__(self, totp, kind="totp"):
+        self.totp = totp
+        self.kind = kind  # libellé des métriques ("unlock", "user")
+        self._state = None  # (compteur, fenêtre, frozenset des codes)
+
+    def __getattr__(self, name):
+        return getattr(self.totp, name)
+
+    def could_be_code(self, code):
+        code = str(code)
+        return len(code) == self.totp.digits and code.isascii() and code.isdigit()
+
+    def expected_codes(self, valid_window=1, for_time=None):
+        counter = int((time.time() if for_time is None else for_time) // self.totp.interval)
+        state = self._state
+        hit = state is not None and state[0] == counter and state[1] == valid_window
+        metrics.record_cache("totp_codes", hit)
+        if not hit:
+            codes = frozenset(
+                self.totp.generate_otp(counter + i)
+                for i in range(-valid_window, valid_window + 1)
+                if counter + i >= 0
+            )
+            state = (counter, valid_window, codes)
+            if for_time is None:
+                self._state = state
+        return state[2]
+
+    def verify(self, code, valid_window=1):
+        if not self.could_be_code(code):
+            metrics.inc("totp_verify_total", "Vérifications TOTP", kind=self.kind, result="rejected")
+            return False
+        ok = str(code) in self.expected_codes(valid_window)
+        metrics.inc("totp_verify_total", "Vérifications TOTP", kind=self.kind, result="ok" if ok else "fail")
+        return ok
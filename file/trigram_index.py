@@ -0,0 +1,114 @@
+# Index inversé de trigrammes pour la recherche partielle sur de grandes listes.
+# Chaque trigramme (3 caractères consécutifs d'une cellule, en minuscules) pointe vers la
+# liste triée des lignes qui le contiennent (array('I'), 4 octets par entrée).
+# Une requête de 3 caractères ou plus ne peut correspondre qu'aux lignes contenant tous
+# ses trigrammes : l'intersection des listes donne un petit ensemble de candidats, que
+# RosterSnapshot vérifie ensuite par comparaison de sous-chaîne (l'index ne fait que
+# filtrer, le résultat est identique à un parcours complet).
+
+import bisect
+import itertools
+import os
+from array import array
+
+GRAM = 3
+
+# en dessous de ce nombre de candidats, vérifier directement chaque ligne (une recherche de
+# sous-chaîne bornée) coûte moins que de continuer les intersections
+_VERIFY_BELOW = 1024
+_BLOCK = 1024  # taille des blocs d'intersection
+# une entrée de liste intersectée coûte environ 6 fois moins qu'une vérification de ligne
+_INTERSECT_RATIO = 6
+
+
+def enabled_for(row_count):
+    """
+    ROSTER_TRIGRAM_INDEX : "1" toujours, "0" jamais, "auto" (défaut) à partir de
+    ROSTER_TRIGRAM_MIN_ROWS lignes (50000 par défaut ; en dessous le parcours est
+    déjà de l'ordre de la milliseconde).
+    """
+    mode = os.environ.get("ROSTER_TRIGRAM_INDEX", "auto").strip().lower()
+    if mode in ("1", "true", "yes", "on"):
+        return True
+    if mode in ("0", "false", "no", "off"):
+        return False
+    return row_count >= int(os.environ.get("ROSTER_TRIGRAM_MIN_ROWS", "50000"))
+
+
+def grams(text):
+    return {text[j:j + GRAM] for j in range(len(text) - GRAM + 1)}
+
+
+class TrigramIndex:
+    def __init__(self, rows, sep):
+        """rows : chaînes de lignes en minuscules, cellules séparées par `sep`."""
+        postings = {}
+        get = postings.get
+        for i, row in enumerate(rows):
+            seen = set()
+            for cell in row.split(sep):
+                if len(cell) >= GRAM:
+                    seen |= grams(cell)
+            for g in seen:
+                lst = get(g)
+                if lst is None:
+                    postings[g] = lst = array("I")
+                lst.append(i)  # lignes parcourues dans l'ordre : listes déjà triées
+        self._postings = postings
+
+    @classmethod
+    def mapped(cls, postings):
+        """Index déjà construit : `postings` a une méthode get(trigramme) -> liste triée ou None."""
+        index = cls.__new__(cls)
+        index._postings = postings
+        return index
+
+    def __len__(self):
+        return len(self._postings)
+
+    def items(self):
+        """(trigramme, liste triée des lignes), par ordre de trigramme."""
+        return sorted(self._postings.items())
+
+    def candidates(self, q_low, start=0):
+        """
+        Itérable des lignes (>= start, dans l'ordre) pouvant contenir q_low, ou None si la
+        requête est trop courte pour l'index (l'appelant parcourt alors toute la liste).
+        """
+        if len(q_low) < GRAM:
+            return None
+        lists = []
+        for g in grams(q_low):
+            lst = self._postings.get(g)
+            if lst is None:
+                return ()
+            lists.append(lst)
+        lists.sort(key=len)
+        return self._intersect(lists, start)
+
+    @staticmethod
+    def _intersect(lists, start):
+        """
+        Intersection paresseuse, par blocs de la plus courte liste : pour chaque bloc, seule
+        la tranche correspondante des autres listes est parcourue (set, en C). Une recherche
+        limitée à une page s'arrête donc sans avoir intersecté les listes entières.
+        """
+        first = lists[0]
+        pos = bisect.bisect_left(first, start)
+        if len(lists) == 1 or len(first) - pos <= _VERIFY_BELOW:
+            yield from itertools.islice(first, pos, None)
+            return
+        others = lists[1:]
+        while pos < len(first):
+            block = first[pos:pos + _BLOCK]
+            pos += _BLOCK
+            lo, hi = block[0], block[-1]
+            kept = set(block)
+            for other in others:
+                i, j = bisect.bisect_left(other, lo), bisect.bisect_right(other, hi)
+                if j - i > _INTERSECT_RATIO * len(kept):
+                    break  # tranche trop longue : vérifier les candidats restants coûte moins
+                kept.intersection_update(other[i:j])
+                if not kept:
+                    break
+            yield from sorted(kept)
@@ -0,0 +1,452 @@
+# Accès partagé à data/users.txt pour app.py et panel_admin.py.
+# Format : username:password:totp_secret[:mode]
+#   - totp_secret vide, 'none' ou non décodable en base32 -> 2FA désactivée (totp None)
+#   - mode 'admin' ou 'user' (toute autre valeur -> 'user')
+# Le fichier est parsé une fois puis gardé en mémoire ; il est relu uniquement quand
+# sa signature (inode/taille/mtime) change.
+# Les modifications (ajout, suppression, rôle, import en masse) sont appliquées en mémoire
+# sous un verrou, puis regroupées en une seule réécriture atomique du fichier.
+# Plusieurs processus (workers, gen_totp_secret.py, édition manuelle) peuvent modifier le
+# fichier : l'écriture se fait sous un verrou de fichier (users.txt.lock) et, si le fichier
+# a changé depuis la dernière lecture, il est relu et les modifications en attente sont
+# rejouées dessus avant l'écriture ; une modification faite ailleurs n'est jamais écrasée.
+# flush() renvoie (ok, msg) : le panel admin et gen_totp_secret.py l'appellent aussitôt
+# après une mutation pour signaler une écriture échouée ou une modification abandonnée.
+
+import atexit
+import base64
+import binascii
+import logging
+import os
+import threading
+
+from file import metrics
+from file.file_watch import stat_signature
+from file.totp_cache import CachedTOTP
+from file.variables_reader import atomic_write
+
+try:
+    import pyotp
+except Exception:
+    pyotp = None
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+MODES = ("admin", "user")
+
+
+def normalize_totp(totp_raw):
+    """Renvoie le secret s'il est une clé base32 valide, sinon None (2FA désactivée)."""
+    totp_raw = (totp_raw or "").strip()
+    if totp_raw == "" or totp_raw.lower() == "none":
+        return None
+    try:
+        base64.b32decode(totp_raw.replace(" ", "").upper(), casefold=True)
+    except (binascii.Error, Exception):
+        return None
+    return totp_raw
+
+
+def format_line(record):
+    """Ligne users.txt d'un enregistrement ; le mode remplace le premier segment du 4ème champ."""
+    totp_field = record["totp"] if record["totp"] is not None else "none"
+    extra = record.get("extra")
+    rest = extra.split(":", 1)[1] if extra and ":" in extra else None
+    fourth = record["mode"] if rest is None else f"{record['mode']}:{rest}"
+    return f"{record['id']}:{record['password']}:{totp_field}:{fourth}"
+
+
+def parse_lines(text):
+    """
+    Lignes de users.txt : (liste de (record ou None, texte normalisé, fin de ligne),
+    True si au moins une ligne a été normalisée).
+    """
+    lines = []
+    changed = False
+    for original_line in text.splitlines(keepends=True):
+        line = original_line.rstrip("\r\n")
+        record, normalized = parse_line(line)
+        lines.append((record, normalized, original_line[len(line):]))
+        if normalized != line:
+            changed = True
+    return lines, changed
+
+
+def parse_line(line):
+    """
+    Parse une ligne de users.txt.
+    Renvoie (record, normalized_line) ; record vaut None pour une ligne vide, un
+    commentaire ou une ligne malformée (moins de 3 champs), conservée telle quelle.
+    """
+    stripped = line.strip()
+    if not stripped or stripped.startswith("#"):
+        return None, line
+    parts = line.split(":", 3)
+    if len(parts) < 3:
+        return None, line
+    username = parts[0].strip()
+    if not username:
+        return None, line
+    password = parts[1].strip()
+    totp_raw = parts[2].strip()
+    extra = parts[3] if len(parts) == 4 else None
+    totp = normalize_totp(totp_raw)
+    mode = (extra or "").split(":")[0].strip().lower() or "user"
+    if mode not in MODES:
+        mode = "user"
+    record = {"id": username, "password": password, "totp": totp, "mode": mode, "extra": extra}
+    normalized_field = totp if totp is not None else "none"
+    if totp_raw == normalized_field:
+        return record, line
+    if extra is not None:
+        return record, f"{username}:{password}:{normalized_field}:{extra}"
+    return record, f"{username}:{password}:{normalized_field}"
+
+
+class UserStore:
+    """
+    Cache des utilisateurs indexé par identifiant, avec objets TOTP préconstruits.
+    Les enregistrements renvoyés sont partagés : ne pas les modifier, passer par
+    add_user / remove_user / set_role / bulk_upsert.
+    flush_delay : délai de l'écriture groupée (0 : immédiate, None : seulement par flush()).
+    """
+
+    def __init__(self, path, flush_delay=0.5):
+        self.path = str(path)
+        self.flush_delay = flush_delay
+        self._lock = threading.RLock()
+        # état publié d'un bloc : (signature, {uid: record}, {uid: CachedTOTP}, lignes)
+        # lignes : liste de (uid ou None, texte sans fin de ligne, fin de ligne)
+        self._state = (None, {}, {}, [])
+        self._dirty = False      # modifications en mémoire pas encore écrites
+        self._mutated = False    # ... dont au moins une vient d'une mutation (pas seulement la normalisation)
+        self._pending = []       # mutations pas encore écrites, rejouées si le fichier a changé entre-temps
+        self._timer = None
+        self._timer_pid = None
+
+    # ---------- chargement ----------
+    def _current(self):
+        state = self._state
+        if self._dirty:
+            # la mémoire fait foi tant que l'écriture groupée n'a pas eu lieu
+            metrics.record_cache("users", True)
+            return state
+        signature = stat_signature(self.path)
+        if signature is None or signature != state[0]:
+            with self._lock:
+                state = self._state
+                if self._dirty:
+                    return state
+                signature = stat_signature(self.path)
+                if signature is None or signature != state[0]:
+                    metrics.record_cache("users", False)
+                    with metrics.timed("users_load_seconds", "Durée de lecture de users.txt"):
+                        return self._load(signature)
+        metrics.record_cache("users", True)
+        return state
+
+    def _load(self, signature):
+        if signature is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            atomic_write(self.path, "")
+            signature = stat_signature(self.path)
+        lines, changed = self._read()
+        self._publish(signature, lines)
+        if changed:
+            # la réécriture des secrets invalides en 'none' se fait hors du chemin des requêtes
+            self._dirty = True
+            if self.flush_delay is not None:
+                self._schedule_flush()
+        return self._state
+
+    def _read(self):
+        metrics.record_file_read("users")
+        with open(self.path, "r", encoding="utf-8") as f:
+            return parse_lines(f.read())
+
+    def _publish(self, signature, lines):
+        """lines : liste de (record ou None, texte, fin de ligne)."""
+        users = {}
+        totps = {}
+        for record, _, _ in lines:
+            if record is None:
+                continue
+            users[record["id"]] = record
+            if record["totp"] is not None and pyotp is not None:
+                totps[record["id"]] = CachedTOTP(pyotp.TOTP(record["totp"]), kind="user")
+        state_lines = [(r["id"] if r else None, text, end) for r, text, end in lines]
+        self._state = (signature, users, totps, state_lines)
+
+    def _records_lines(self):
+        """Lignes courantes sous la forme attendue par _publish (à appeler sous verrou)."""
+        _, users, _, lines = self._state
+        return [(users.get(uid) if uid is not None else None, text, end) for uid, text, end in lines]
+
+    def invalidate(self):
+        """Force la relecture au prochain accès (après une écriture externe)."""
+        with self._lock:
+            if not self._dirty:
+                self._state = (None,) + self._state[1:]
+
+    # ---------- écriture groupée ----------
+    def _schedule_flush(self, delay=None):
+        # un Timer hérité d'un fork n'existe pas dans ce processus : on en relance un
+        if self._timer is not None and self._timer_pid == os.getpid():
+            return
+        self._timer = threading.Timer(self.flush_delay if delay is None else delay, self.flush)
+        self._timer.daemon = True
+        self._timer_pid = os.getpid()
+        self._timer.start()
+
+    def _file_lock(self):
+        """Verrou exclusif entre processus sur users.txt.lock (à fermer après l'écriture)."""
+        lock = open(self.path + ".lock", "a")
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def flush(self):
+        """
+        Écrit users.txt (écriture atomique) si des modifications sont en attente. Si le
+        fichier a changé depuis la dernière lecture, il est relu et les mutations en
+        attente sont rejouées sur son contenu actuel.
+        Renvoie (ok, msg) : ok est faux si l'écriture a échoué (modifications gardées en
+        mémoire, nouvel essai programmé sauf avec flush_delay=None) ou si des mutations
+        n'ont pas pu être rejouées (abandonnées, les autres sont écrites).
+        """
+        with self._lock:
+            self._timer = None
+            if not self._dirty:
+                return True, ""
+            dropped = []
+            try:
+                with self._file_lock():
+                    signature = stat_signature(self.path)
+                    if signature == self._state[0]:
+                        lines = self._records_lines()
+                    elif not self._mutated:
+                        # fichier modifié entre-temps : la normalisation sera refaite à la relecture
+                        self._dirty = False
+                        self._state = (None,) + self._state[1:]
+                        return True, ""
+                    else:
+                        lines = self._replay(self._read()[0] if signature is not None else [], dropped)
+                    atomic_write(self.path, "".join(text + end for _, text, end in lines))
+                    self._publish(stat_signature(self.path), lines)
+            except Exception as e:
+                log.exception("Erreur lors de l'écriture de %s", self.path)
+                metrics.inc("users_write_errors_total", "Échecs d'écriture de users.txt", reason="write")
+                if self.flush_delay is not None:
+                    # flush_delay=0 : pas de nouvel essai immédiat en boucle
+                    self._schedule_flush(max(self.flush_delay, 1.0))
+                return False, f"Erreur lors de l'écriture de {os.path.basename(self.path)} : {e}"
+            self._dirty = False
+            self._mutated = False
+            self._pending = []
+        if dropped:
+            metrics.inc("users_write_errors_total", "Échecs d'écriture de users.txt", n=len(dropped), reason="dropped")
+            return False, (f"{os.path.basename(self.path)} modifié hors de l'application, "
+                           f"modification(s) abandonnée(s) : {' '.join(dropped)}")
+        return True, ""
+
+    def _replay(self, lines, dropped):
+        """Rejoue les mutations en attente sur les lignes relues du fichier (messages des échecs dans dropped)."""
+        for op in self._pending:
+            ok, msg, new_lines = op(lines)
+            if ok:
+                lines = new_lines
+            else:
+                log.warning("%s modifié hors de l'application, modification abandonnée : %s", self.path, msg)
+                dropped.append(msg)
+        return lines
+
+    def _commit(self, lines):
+        """
+        Publie les nouvelles lignes en mémoire et programme l'écriture (sous verrou).
+        Renvoie le résultat de flush() quand l'écriture est immédiate (flush_delay=0).
+        """
+        self._publish(self._state[0], lines)
+        self._dirty = True
+        self._mutated = True
+        if self.flush_delay is None:
+            return True, ""
+        if self.flush_delay <= 0:
+            return self.flush()
+        self._schedule_flush()
+        return True, ""
+
+    def _mutate(self, op):
+        """
+        op(lignes) -> (ok, message, nouvelles lignes) : appliquée à l'état courant, puis
+        gardée pour être rejouée si le fichier change avant l'écriture.
+        """
+        with self._lock:
+            self._current()
+            ok, msg, lines = op(self._records_lines())
+            if ok:
+                self._pending.append(op)
+                written, err = self._commit(lines)
+                if not written:
+                    return False, err
+        return ok, msg
+
+    @staticmethod
+    def _ids(lines):
+        return {record["id"] for record, _, _ in lines if record is not None}
+
+    @staticmethod
+    def _append(lines, record):
+        if lines and lines[-1][2] == "":
+            r, text, _ = lines[-1]
+            lines[-1] = (r, text, "\n")
+        lines.append((record, format_line(record), "\n"))
+
+    # ---------- mutations ----------
+    def add_user(self, uid, pwd, totp="", mode="user"):
+        uid = (uid or "").strip()
+        if not uid:
+            return False, "Identifiant vide."
+        if ":" in uid or ":" in (pwd or ""):
+            return False, "Le caractère ':' est interdit."
+        if mode not in MODES:
+            return False, "Mode invalide."
+        record = {"id": uid, "password": (pwd or "").strip(), "totp": normalize_totp(totp), "mode": mode, "extra": None}
+
+        def op(lines):
+            if uid in self._ids(lines):
+                return False, "Utilisateur déjà existant.", lines
+            lines = list(lines)
+            self._append(lines, record)
+            return True, "Utilisateur ajouté.", lines
+        return self._mutate(op)
+
+    def remove_user(self, uid):
+        def op(lines):
+            if uid not in self._ids(lines):
+                return False, "Utilisateur introuvable.", lines
+            return True, "Utilisateur supprimé.", [entry for entry in lines if not (entry[0] and entry[0]["id"] == uid)]
+        return self._mutate(op)
+
+    def set_role(self, uid, mode):
+        if mode not in MODES:
+            return False, "Mode invalide."
+
+        def op(lines):
+            if uid not in self._ids(lines):
+                return False, "Utilisateur introuvable.", lines
+            out = []
+            for record, text, end in lines:
+                if record and record["id"] == uid:
+                    record = dict(record, mode=mode)
+                    text = format_line(record)
+                out.append((record, text, end))
+            return True, "Rôle mis à jour.", out
+        return self._mutate(op)
+
+    def bulk_upsert(self, entries):
+        """
+        Ajoute ou modifie plusieurs comptes en une seule écriture.
+        entries : itérable de dicts {"id", "pwd", "totp", "mode"} ; pour un compte existant,
+        seuls les champs fournis et non vides sont modifiés (totp 'none' désactive la 2FA).
+        Renvoie (ok, msg) ; rien n'est appliqué si une entrée est invalide.
+        """
+        entries = list(entries)
+
+        def op(lines):
+            lines = list(lines)
+            position = {}
+            for i, (record, _, _) in enumerate(lines):
+                if record is not None:
+                    position[record["id"]] = i
+            added = updated = 0
+            for n, entry in enumerate(entries, 1):
+                uid = str(entry.get("id") or "").strip()
+                pwd = str(entry.get("pwd") or "").strip()
+                totp = str(entry.get("totp") or "").strip()
+                mode = str(entry.get("mode") or "").strip().lower()
+                if not uid:
+                    return False, f"Entrée {n} : identifiant vide.", lines
+                if ":" in uid or ":" in pwd:
+                    return False, f"Entrée {n} : le caractère ':' est interdit.", lines
+                if mode and mode not in MODES:
+                    return False, f"Entrée {n} : mode invalide.", lines
+                if uid in position:
+                    i = position[uid]
+                    record = dict(lines[i][0])
+                    if pwd:
+                        record["password"] = pwd
+                    if totp:
+                        record["totp"] = normalize_totp(totp)
+                    if mode:
+                        record["mode"] = mode
+                    lines[i] = (record, format_line(record), lines[i][2])
+                    updated += 1
+                else:
+                    if not pwd:
+                        return False, f"Entrée {n} : mot de passe requis pour un nouveau compte.", lines
+                    record = {"id": uid, "password": pwd, "totp": normalize_totp(totp), "mode": mode or "user", "extra": None}
+                    self._append(lines, record)
+                    position[uid] = len(lines) - 1
+                    added += 1
+            if not added and not updated:
+                return False, "Aucune entrée.", lines
+            return True, f"{added} utilisateur(s) ajouté(s), {updated} modifié(s).", lines
+        return self._mutate(op)
+
+    # ---------- lecture ----------
+    def users(self):
+        """Dictionnaire {username: record} (lecture seule)."""
+        return self._current()[1]
+
+    def list(self):
+        """Enregistrements dans l'ordre du fichier."""
+        return list(self._current()[1].values())
+
+    def get(self, uid):
+        return self._current()[1].get(uid)
+
+    def totp(self, uid):
+        """TOTP préconstruit (CachedTOTP), ou None si la 2FA est désactivée pour ce compte."""
+        return self._current()[2].get(uid)
+
+    def verify_password(self, uid, pwd):
+        u = self.get(uid)
+        return bool(u) and u["password"] == pwd
+
+    def verify_totp(self, uid, token):
+        totp = self.totp(uid)
+        if totp is None:
+            return False
+        try:
+            return totp.verify(token, valid_window=1)
+        except Exception:
+            return False
+
+    def is_admin(self, uid):
+        u = self.get(uid)
+        return bool(u and u["mode"] == "admin")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path):
+    """Instance partagée par chemin : app.py et panel_admin.py utilisent le même cache."""
+    key = os.path.abspath(str(path))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = UserStore(key, flush_delay=float(os.environ.get("USERS_FLUSH_DELAY", "0.5")))
+        return store
+
+
+@atexit.register
+def _flush_all():
+    for store in list(_stores.values()):
+        store.flush()
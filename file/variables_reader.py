@@ -23,6 +23,8 @@ def atomic_write(path, content):
     try:
         with os.fdopen(fd, "w", encoding="utf-8") as f:
             f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
         os.replace(tmp_path, path)
     finally:
         # si une erreur survient et le tmp existe, essayer de le supprimer
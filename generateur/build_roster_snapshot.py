@@ -0,0 +1,70 @@
+"""
+build_roster_snapshot.py - compile les CSV des identifiants en snapshots binaires
+
+Usage :
+    python generateur/build_roster_snapshot.py                     # tous les CSV de csv/
+    python generateur/build_roster_snapshot.py csv/all_vrai.csv    # un CSV
+    python generateur/build_roster_snapshot.py --check             # snapshots à jour ?
+
+Chaque CSV est compilé en data/<nom du csv>.roster (ROSTER_MMAP_DIR pour un autre dossier) :
+table des chaînes, positions des lignes, index de suggestions et de trigrammes, au format
+décrit dans file/roster_mmap.py. app.py ouvre ce fichier avec mmap au démarrage et à
+chaque rechargement au lieu de parser le CSV ; si le CSV a changé depuis (taille, mtime
+puis hash du contenu), le snapshot est ignoré et le CSV est lu comme avant. Relancer ce
+script après chaque modification du CSV (gen_password_csv.py, export) pour retrouver un
+démarrage instantané.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+CSV_DIR = os.path.join(BASE_DIR, "csv")
+
+
+def main(argv=None):
+    from file.roster_mmap import FORMAT_VERSION, is_fresh, mapped_path_for, read_header, write_mapped
+
+    parser = argparse.ArgumentParser(description="Compile les CSV des identifiants en snapshots binaires (mmap).")
+    parser.add_argument("csv", nargs="*", help="CSV à compiler (défaut : tous les CSV de csv/)")
+    parser.add_argument("--trigrams", choices=("auto", "1", "0"), default="auto",
+                        help="index de trigrammes : auto (selon ROSTER_TRIGRAM_INDEX / la taille), 1 toujours, 0 jamais")
+    parser.add_argument("--check", action="store_true", help="indiquer les snapshots absents ou périmés sans compiler")
+    parser.add_argument("--force", action="store_true", help="recompiler même si le snapshot est à jour")
+    args = parser.parse_args(argv)
+
+    paths = args.csv or sorted(glob.glob(os.path.join(CSV_DIR, "*.csv")))
+    if not paths:
+        print(f"Aucun CSV dans {CSV_DIR}", file=sys.stderr)
+        return 1
+    trigram = {"auto": None, "1": True, "0": False}[args.trigrams]
+    status = 0
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"Fichier introuvable : {path}", file=sys.stderr)
+            status = 1
+            continue
+        out = mapped_path_for(path)
+        fresh = is_fresh(read_header(out), path)
+        if args.check:
+            print(f"  {path} -> {out} : {'à jour' if fresh else 'absent ou périmé'}")
+            status = status or (0 if fresh else 2)
+            continue
+        if fresh and not args.force:
+            print(f"  {path} -> {out} : déjà à jour")
+            continue
+        start = time.perf_counter()
+        meta = write_mapped(path, out, trigram=trigram)
+        size = os.path.getsize(out)
+        print(f"  {path} -> {out} : {meta['rows']} lignes, {size / 1e6:.1f} Mo, "
+              f"format v{FORMAT_VERSION}, {'avec' if 'trigram_keys' in meta['sections'] else 'sans'} trigrammes, "
+              f"{time.perf_counter() - start:.2f} s")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,32 +1,301 @@
+"""
+gen_password_csv.py - mots de passe du CSV des identifiants (colonne 6, index 5)
+
+Usage :
+    python generateur/gen_password_csv.py                     # régénère csv/all.csv
+    python generateur/gen_password_csv.py chemin/liste.csv    # régénère un autre CSV
+    python generateur/gen_password_csv.py --synth 1000000 --out /tmp/all.csv
+                                                              # crée une liste synthétique
+    python generateur/gen_password_csv.py --batch csv/sites --jobs 4
+                                                              # régénère tous les CSV d'un dossier
+
+Le CSV est lu et réécrit ligne par ligne (mémoire constante hors ensemble d'unicité),
+dans un fichier temporaire remplacé atomiquement à la fin : un lecteur (app.py) ne voit
+jamais un fichier à moitié écrit.
+Les mots de passe viennent de secrets.token_bytes par lots, convertis vers l'alphabet
+A-Z0-9 en une passe (bytes.translate) ; leur unicité est garantie par un ensemble compact
+d'entiers (CodeSet, ~8 à 16 octets par mot de passe).
+
+En mode --batch, chaque CSV du dossier est traité par un processus distinct. L'unicité
+reste globale sans communication entre processus : le fichier n° k sur n ne reçoit que
+des mots de passe dont le code (base 36) vaut k modulo n.
+"""
+import argparse
 import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
 import random
+import secrets
 import string
+import sys
+import tempfile
+import time
+from array import array
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+fichier_csv = os.path.join(BASE_DIR, "csv", "all.csv")
+
+CSV_HEADER = ["classe", "name", "vide", "vide", "identifiant", "password", "vide"]
+PASSWORD_COLUMN = 5
+PASSWORD_LENGTH = 6
+ALPHABET = string.digits + string.ascii_uppercase  # ordre base 36 : int(mdp, 36) donne le code
+
+SURNAMES = ["MARTIN", "BERNARD", "DUBOIS", "THOMAS", "ROBERT", "RICHARD", "PETIT", "DURAND", "LEROY", "MOREAU",
+            "SIMON", "LAURENT", "LEFÈVRE", "MICHEL", "GARCIA", "DAVID", "BERTRAND", "ROUX", "VINCENT", "FOURNIER",
+            "MOREL", "GIRARD", "ANDRÉ", "MERCIER", "DUPONT", "LAMBERT", "BONNET", "FRANÇOIS", "MARTINEZ", "BENABID"]
+FIRSTNAMES = ["LINA", "ADAM", "EMMA", "LÉO", "JADE", "NOAH", "LOUISE", "GABRIEL", "ALICE", "RAPHAËL", "CHLOÉ",
+              "ARTHUR", "INÈS", "LOUIS", "LÉA", "JULES", "MAËL", "ZOÉ", "HUGO", "YASSINE", "MALIK", "HÉLÈNE"]
+
+
+class CodeSet:
+    """
+    Ensemble d'entiers positifs à adressage ouvert dans un array (4 octets par case pour
+    des codes < 2**32, 8 sinon), redimensionné au-delà de 50 % de remplissage.
+    Bien plus compact qu'un set Python pour des millions de mots de passe.
+    """
+
+    def __init__(self, max_value, capacity=1024):
+        self.typecode = "I" if max_value < 2 ** 32 - 1 and array("I").itemsize >= 4 else "Q"
+        size = 1
+        while size < capacity * 2:
+            size *= 2
+        self._table = array(self.typecode, bytes(size * array(self.typecode).itemsize))
+        self._mask = size - 1
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _slot(self, stored):
+        table = self._table
+        mask = self._mask
+        i = (stored * 2654435761) & mask
+        while True:
+            v = table[i]
+            if v == 0 or v == stored:
+                return i
+            i = (i + 1) & mask
+
+    def add(self, code):
+        """Ajoute code ; renvoie False s'il était déjà présent."""
+        stored = code + 1  # 0 = case vide
+        i = self._slot(stored)
+        if self._table[i] == stored:
+            return False
+        self._table[i] = stored
+        self._count += 1
+        if self._count * 2 > self._mask + 1:
+            self._grow()
+        return True
+
+    def __contains__(self, code):
+        return self._table[self._slot(code + 1)] == code + 1
+
+    def _grow(self):
+        old = self._table
+        size = (self._mask + 1) * 2
+        self._table = array(self.typecode, bytes(size * old.itemsize))
+        self._mask = size - 1
+        for stored in old:
+            if stored:
+                self._table[self._slot(stored)] = stored
+
+
+class PasswordGenerator:
+    """
+    Mots de passe uniques de `length` caractères A-Z0-9.
+    Octets aléatoires tirés par lots ; les octets >= 252 sont écartés pour que
+    chaque caractère soit uniforme (252 = 7 x 36).
+    partition=(k, n) restreint les codes à ceux qui valent k modulo n (mode --batch).
+    """
+
+    def __init__(self, length=PASSWORD_LENGTH, batch=65536, used=None, partition=None):
+        self.length = length
+        self.batch = batch
+        self.space = len(ALPHABET) ** length
+        self.partition = partition
+        limit = len(ALPHABET) * (256 // len(ALPHABET))
+        self._table = bytes.maketrans(bytes(range(limit)), (ALPHABET * (256 // len(ALPHABET))).encode("ascii"))
+        self._reject = bytes(range(limit, 256))
+        self._buffer = b""
+        self._pos = 0
+        self.used = used if used is not None else CodeSet(self.space)
+
+    def _refill(self):
+        self._buffer = secrets.token_bytes(self.batch).translate(self._table, self._reject)
+        self._pos = 0
+
+    def __call__(self):
+        n = self.length
+        while True:
+            if self._pos + n > len(self._buffer):
+                self._refill()
+            mdp = self._buffer[self._pos:self._pos + n].decode("ascii")
+            self._pos += n
+            code = int(mdp, 36)
+            if self.partition is not None:
+                # ramène le code dans sa classe de résidus ; chaque code de la classe a
+                # exactement n antécédents, le dernier bloc incomplet est écarté
+                k, parts = self.partition
+                code += k - code % parts
+                if code >= self.space:
+                    continue
+                mdp = encode_code(code, n)
+            if self.used.add(code):
+                return mdp
+
+
+def encode_code(code, length=PASSWORD_LENGTH):
+    """Inverse de int(mdp, 36) sur `length` caractères."""
+    chars = []
+    for _ in range(length):
+        code, r = divmod(code, 36)
+        chars.append(ALPHABET[r])
+    return "".join(reversed(chars))
+
+
+def atomic_csv_writer(path):
+    """(fichier temporaire ouvert, chemin temporaire) dans le dossier de path."""
+    dirn = os.path.dirname(os.path.abspath(path)) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=dirn, suffix=".csv.tmp")
+    return os.fdopen(fd, "w", newline="", encoding="utf-8"), tmp_path
+
+
+def _commit(f, tmp_path, path):
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    # mkstemp crée le fichier en 0600 : reprendre les droits du fichier remplacé (ou ceux par défaut)
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(tmp_path, mode)
+    os.replace(tmp_path, path)
+
+
+def regenerate_passwords(path, generator=None):
+    """Remplace la colonne mot de passe de chaque ligne (sauf l'en-tête). Renvoie le nombre de lignes."""
+    generator = generator or PasswordGenerator()
+    count = 0
+    out, tmp_path = atomic_csv_writer(path)
+    try:
+        with open(path, newline="", encoding="utf-8") as src:
+            reader = csv.reader(src)
+            writer = csv.writer(out)
+            header = next(reader, None)
+            if header is not None:
+                writer.writerow(header)
+            for row in reader:
+                if len(row) > PASSWORD_COLUMN:
+                    row[PASSWORD_COLUMN] = generator()
+                    count += 1
+                writer.writerow(row)
+        _commit(out, tmp_path, path)
+    finally:
+        if not out.closed:
+            out.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
+
+
+def _regenerate_part(job):
+    path, k, parts = job
+    start = time.perf_counter()
+    count = regenerate_passwords(path, PasswordGenerator(partition=(k, parts)))
+    return path, count, time.perf_counter() - start
+
+
+def batch_regenerate(directory, jobs=None):
+    """
+    Régénère les mots de passe de tous les *.csv de `directory` en parallèle (un
+    processus par fichier, au plus `jobs`). Renvoie [(chemin, lignes, secondes)].
+    """
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(".csv") and os.path.isfile(os.path.join(directory, name))
+    )
+    work = [(path, k, len(paths)) for k, path in enumerate(paths)]
+    if not work:
+        return []
+    if jobs == 1 or len(work) == 1:
+        return [_regenerate_part(job) for job in work]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(_regenerate_part, work))
+
+
+def synthetic_rows(count, seed=None):
+    """Lignes synthétiques au schéma de all.csv (identifiants uniques par construction)."""
+    rng = random.Random(seed)
+    for n in range(count):
+        surname = rng.choice(SURNAMES)
+        first = rng.choice(FIRSTNAMES)
+        ident = f"{surname[:6]}{first[0]}{n}"
+        classe = f"{rng.randint(1, 6)}{rng.randint(1, 9)}"
+        yield [classe, f"{surname} {first}", "", "", ident, "", ""]
 
-fichier_csv = "./csvcsv/all.csv"
 
-def generer_mdp(existants):
-    caracteres = string.ascii_uppercase + string.digits
-    while True:
-        mdp = ''.join(random.choice(caracteres) for _ in range(6))
-        if mdp not in existants:
-            existants.add(mdp)
-            return mdp
+def write_synthetic_roster(path, count, seed=None, generator=None):
+    """Crée un CSV synthétique de `count` lignes avec des mots de passe uniques."""
+    generator = generator or PasswordGenerator()
+    out, tmp_path = atomic_csv_writer(path)
+    try:
+        writer = csv.writer(out)
+        writer.writerow(CSV_HEADER)
+        for row in synthetic_rows(count, seed):
+            row[PASSWORD_COLUMN] = generator()
+            writer.writerow(row)
+        _commit(out, tmp_path, path)
+    finally:
+        if not out.closed:
+            out.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
 
-# Lire le CSV
-with open(fichier_csv, newline='', encoding='utf-8') as csvfile:
-    reader = list(csv.reader(csvfile))
 
-# Ensemble pour garder les mots de passe uniques
-mdp_utilises = set()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génère les mots de passe du CSV des identifiants.")
+    parser.add_argument("csv", nargs="?", default=fichier_csv, help="CSV à régénérer (défaut : csv/all.csv)")
+    parser.add_argument("--synth", type=int, metavar="LIGNES", help="créer une liste synthétique de LIGNES lignes")
+    parser.add_argument("--out", help="fichier de sortie pour --synth")
+    parser.add_argument("--seed", type=int, help="graine des noms synthétiques (les mots de passe restent aléatoires)")
+    parser.add_argument("--batch", metavar="DOSSIER", help="régénérer tous les CSV du dossier (unicité globale)")
+    parser.add_argument("--jobs", type=int, help="processus pour --batch (défaut : nombre de CPU)")
+    args = parser.parse_args(argv)
 
-# Remplacer la 6ème colonne en sautant la première ligne
-for row in reader[1:]:
-    if len(row) >= 6:
-        row[5] = generer_mdp(mdp_utilises)
+    start = time.perf_counter()
+    if args.batch:
+        if not os.path.isdir(args.batch):
+            print(f"Dossier introuvable : {args.batch}", file=sys.stderr)
+            return 1
+        results = batch_regenerate(args.batch, jobs=args.jobs)
+        elapsed = time.perf_counter() - start
+        for path, count, seconds in results:
+            print(f"  {path} : {count} lignes en {seconds:.2f} s")
+        total = sum(count for _, count, _ in results)
+        rate = total / elapsed if elapsed else 0.0
+        print(f"Un nouvelle ensemble de mot de passe a été generé ({len(results)} fichiers, {total} lignes, "
+              f"{elapsed:.2f} s, {rate:.0f} lignes/s)")
+        return 0
+    if args.synth is not None:
+        if not args.out:
+            parser.error("--synth nécessite --out")
+        count = write_synthetic_roster(args.out, args.synth, seed=args.seed)
+        target = args.out
+    else:
+        if not os.path.exists(args.csv):
+            print(f"Fichier introuvable : {args.csv}", file=sys.stderr)
+            return 1
+        count = regenerate_passwords(args.csv)
+        target = args.csv
+    elapsed = time.perf_counter() - start
+    print(f"Un nouvelle ensemble de mot de passe a été generé ({count} lignes, {target}, {elapsed:.2f} s)")
+    return 0
 
-# Écrire directement dans le même fichier
-with open(fichier_csv, 'w', newline='', encoding='utf-8') as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerows(reader)
 
-print("Un nouvelle ensemble de mot de passe a été generé")
+if __name__ == "__main__":
+    sys.exit(main())
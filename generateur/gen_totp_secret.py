@@ -1,9 +1,167 @@
+"""
+gen_totp_secret.py - clés TOTP base32
+
+Usage :
+    python generateur/gen_totp_secret.py                        # affiche une clé
+    python generateur/gen_totp_secret.py --accounts comptes.txt --out totp_export
+    python generateur/gen_totp_secret.py --accounts comptes.csv --out totp_export --qr --jobs 4
+
+--accounts : un compte par ligne (identifiant[,mode]) ; les lignes vides ou commençant
+par '#' sont ignorées. Les clés sont écrites dans data/users.txt (ou --users) en une seule
+mise à jour atomique : un compte existant garde son mot de passe, un nouveau compte reçoit
+un mot de passe aléatoire.
+Le dossier --out reçoit accounts.csv (identifiant, mot de passe si nouveau, clé, URI
+otpauth://) et, avec --qr, un PNG par compte (module qrcode requis), rendus en parallèle.
+"""
+import argparse
+import base64
+import csv
+import os
 import secrets
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+USERS_FILE = os.path.join(BASE_DIR, "data", "users.txt")
+ISSUER = "WebMagret"
+
+try:
+    import qrcode
+except Exception:
+    qrcode = None
+
 
 def generate_base32_secret(length=32):
-    alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567'
-    return ''.join(secrets.choice(alphabet) for _ in range(length))
+    # 5 octets aléatoires = 8 caractères base32, sans padding quand length est multiple de 8
+    raw = secrets.token_bytes((length * 5 + 7) // 8)
+    return base64.b32encode(raw).decode("ascii")[:length]
+
+
+def generate_password(length=12):
+    alphabet = "ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz23456789"
+    return "".join(secrets.choice(alphabet) for _ in range(length))
+
+
+def read_accounts(path):
+    """[(identifiant, mode)] depuis un fichier texte/CSV ; mode vide = inchangé."""
+    accounts = []
+    seen = set()
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+                continue
+            uid = row[0].strip()
+            if uid.lower() in ("id", "identifiant") and not accounts:
+                continue  # en-tête
+            if uid in seen:
+                continue
+            seen.add(uid)
+            accounts.append((uid, row[1].strip().lower() if len(row) > 1 else ""))
+    return accounts
+
+
+def provisioning_uri(uid, secret, issuer=ISSUER):
+    import pyotp
+
+    return pyotp.TOTP(secret).provisioning_uri(name=uid, issuer_name=issuer)
+
+
+def qr_filename(uid):
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in uid)
+    return f"{safe}.png"
+
+
+def _render_qr(job):
+    uri, path = job
+    qrcode.make(uri).save(path)
+    return path
+
+
+def provision(accounts, users_path=USERS_FILE, out_dir=None, issuer=ISSUER, qr=False, jobs=None):
+    """
+    Génère une clé par compte et l'applique à users.txt en une écriture.
+    Le manifeste et les QR codes sont écrits avant users.txt : si leur écriture échoue,
+    aucun compte n'est créé ou modifié sans que ses identifiants aient été enregistrés.
+    Renvoie (ok, msg, rows) avec rows = [(identifiant, mot de passe ou "", clé, uri)] ;
+    ok est faux si users.txt n'a pas pu être écrit entièrement après le manifeste (rows
+    est alors non vide : le manifeste ne correspond pas aux comptes actifs).
+    """
+    from file.user_store import UserStore
+
+    # modifications validées en mémoire, users.txt écrit seulement par le flush() final
+    store = UserStore(users_path, flush_delay=None)
+    rows = []
+    entries = []
+    for uid, mode in accounts:
+        secret = generate_base32_secret()
+        pwd = "" if store.get(uid) else generate_password()
+        entries.append({"id": uid, "pwd": pwd, "totp": secret, "mode": mode})
+        rows.append((uid, pwd, secret, provisioning_uri(uid, secret, issuer)))
+    ok, msg = store.bulk_upsert(entries)
+    if not ok:
+        return False, msg, []
+
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        # contient des mots de passe et des clés : lisible par le seul propriétaire
+        manifest = os.path.join(out_dir, "accounts.csv")
+        fd = os.open(manifest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "password", "totp_secret", "otpauth_uri"])
+            writer.writerows(rows)
+        if qr:
+            work = [(uri, os.path.join(out_dir, qr_filename(uid))) for uid, _, _, uri in rows]
+            if jobs == 1 or len(work) < 2:
+                for job in work:
+                    _render_qr(job)
+            else:
+                with ProcessPoolExecutor(max_workers=jobs) as pool:
+                    for _ in pool.map(_render_qr, work, chunksize=64):
+                        pass
+    written, err = store.flush()
+    if not written:
+        return False, err, rows
+    return True, msg, rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génère des clés TOTP base32 (une ou en masse).")
+    parser.add_argument("--accounts", help="fichier des comptes à provisionner (identifiant[,mode] par ligne)")
+    parser.add_argument("--users", default=USERS_FILE, help="fichier utilisateurs (défaut : data/users.txt)")
+    parser.add_argument("--out", help="dossier de sortie (accounts.csv, QR codes)")
+    parser.add_argument("--issuer", default=ISSUER, help=f"émetteur affiché dans l'application TOTP (défaut : {ISSUER})")
+    parser.add_argument("--qr", action="store_true", help="générer un PNG par compte (module qrcode)")
+    parser.add_argument("--jobs", type=int, help="processus pour les QR codes (défaut : nombre de CPU)")
+    args = parser.parse_args(argv)
+
+    if not args.accounts:
+        print(generate_base32_secret())
+        return 0
+    if not args.out:
+        parser.error("--accounts nécessite --out (les mots de passe et clés générés y sont écrits)")
+    if args.qr and qrcode is None:
+        print("Module qrcode absent : pip install qrcode[pil]", file=sys.stderr)
+        return 1
+    if not os.path.exists(args.accounts):
+        print(f"Fichier introuvable : {args.accounts}", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    ok, msg, rows = provision(read_accounts(args.accounts), users_path=args.users, out_dir=args.out,
+                              issuer=args.issuer, qr=args.qr, jobs=args.jobs)
+    if not ok:
+        print(msg, file=sys.stderr)
+        if rows:
+            print(f"ATTENTION : {args.out} contient des mots de passe et clés qui ne sont pas (tous) "
+                  f"actifs dans {args.users} ; ne pas les distribuer, relancer la commande.", file=sys.stderr)
+        return 1
+    print(f"{msg} {len(rows)} clés TOTP générées en {time.perf_counter() - start:.2f} s -> {args.out}")
+    return 0
+
 
 if __name__ == "__main__":
-    secret = generate_base32_secret()
-    print(secret)
\ No newline at end of file
+    sys.exit(main())
@@ -1,10 +1,15 @@
+import hmac
 import os
 import tempfile
 from flask import (
     Flask, request, redirect, url_for, session, flash,
-    render_template_string
+    render_template, Response
 )
 from file.variables_reader import read_variables
+from file.user_store import get_store
+from file.rate_limit import LOGIN_LIMITER, too_many_requests
+from file.session_store import get_session_interface
+from file import metrics
 vars = read_variables()
 
 try:
@@ -19,6 +24,9 @@ VARIABLES_FILE = os.path.join(DATA_DIR, "variables.txt")
 
 ALLOWED_VARIABLES = ("serveur", "csv_réel")
 
+# cache partagé avec app.py
+user_store = get_store(USERS_FILE)
+
 
 # ---------- fichiers & atomic write ----------
 def ensure_data_dir():
@@ -32,6 +40,8 @@ def atomic_write(path, content):
     try:
         with os.fdopen(fd, "w", encoding="utf-8") as f:
             f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
         os.replace(tmp_path, path)
     finally:
         try:
@@ -42,118 +52,80 @@ def atomic_write(path, content):
 
 
 # ---------- users handling ----------
-def parse_user_line(line):
-    s = line.strip()
-    if not s or s.startswith("#"):
-        return None
-    parts = s.split(":")
-    # normalize to 4 fields
-    while len(parts) < 4:
-        parts.append("")
-    uid = parts[0].strip()
-    pwd = parts[1]
-    totp = parts[2]
-    mode = parts[3].strip().lower() or "user"
-    if mode not in ("admin", "user"):
-        mode = "user"
-    if not uid:
-        return None
-    return {"id": uid, "pwd": pwd, "totp": totp, "mode": mode}
-
-
-def read_users():
-    ensure_data_dir()
-    if not os.path.exists(USERS_FILE):
-        atomic_write(USERS_FILE, "")
-        return []
-    users = []
-    with open(USERS_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            u = parse_user_line(line)
-            if u:
-                users.append(u)
-    return users
-
-
-def write_users(users):
-    lines = []
-    for u in users:
-        lines.append(f"{u['id']}:{u.get('pwd','')}:{u.get('totp','')}:{u.get('mode','user')}")
-    atomic_write(USERS_FILE, "\n".join(lines) + ("\n" if lines else ""))
+# Toutes les lectures/écritures passent par le UserStore partagé : les mutations sont
+# appliquées en mémoire sous verrou, puis écrites dans users.txt avant de répondre à
+# l'admin (le message affiché dit si la modification a vraiment été enregistrée).
+def find_user(uid):
+    return user_store.get(uid)
 
 
-def find_user(uid):
-    for u in read_users():
-        if u["id"] == uid:
-            return u
-    return None
+def _saved(result):
+    """Écrit users.txt tout de suite après une mutation réussie ; (False, erreur) si l'écriture échoue."""
+    ok, msg = result
+    if ok:
+        written, err = user_store.flush()
+        if not written:
+            return False, err
+    return ok, msg
 
 
 def add_user(uid, pwd, totp="", mode="user"):
-    uid = uid.strip()
-    if not uid:
-        return False, "Identifiant vide."
-    if mode not in ("admin", "user"):
-        return False, "Mode invalide."
-    users = read_users()
-    if any(u["id"] == uid for u in users):
-        return False, "Utilisateur déjà existant."
-    users.append({"id": uid, "pwd": pwd, "totp": totp, "mode": mode})
-    write_users(users)
-    return True, "Utilisateur ajouté."
+    return _saved(user_store.add_user(uid, pwd, totp, mode))
 
 
 def remove_user(uid):
-    users = read_users()
-    new_users = [u for u in users if u["id"] != uid]
-    if len(new_users) == len(users):
-        return False, "Utilisateur introuvable."
-    write_users(new_users)
-    return True, "Utilisateur supprimé."
+    return _saved(user_store.remove_user(uid))
 
 
 def set_role(uid, mode):
-    if mode not in ("admin", "user"):
-        return False, "Mode invalide."
-    users = read_users()
-    found = False
-    for u in users:
-        if u["id"] == uid:
-            u["mode"] = mode
-            found = True
-            break
-    if not found:
-        return False, "Utilisateur introuvable."
-    write_users(users)
-    return True, "Rôle mis à jour."
+    return _saved(user_store.set_role(uid, mode))
+
+
+def parse_bulk_users(filename, data):
+    """
+    Lit un import en masse : JSON (liste d'objets {id, pwd, totp, mode}) ou CSV
+    (colonnes id,pwd,totp,mode ; ligne d'en-tête facultative).
+    Renvoie (entries, None) ou (None, message d'erreur).
+    """
+    import csv
+    import io
+    import json
+
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return None, "Fichier non UTF-8."
+    if (filename or "").lower().endswith(".json") or text.lstrip().startswith("["):
+        try:
+            entries = json.loads(text)
+        except ValueError as e:
+            return None, f"JSON invalide : {e}"
+        if not isinstance(entries, list) or not all(isinstance(e, dict) for e in entries):
+            return None, "JSON attendu : liste d'objets {id, pwd, totp, mode}."
+        return entries, None
+    fields = ("id", "pwd", "totp", "mode")
+    entries = []
+    for row in csv.reader(io.StringIO(text)):
+        if not row or not "".join(row).strip():
+            continue
+        if not entries and [c.strip().lower() for c in row[:2]] == ["id", "pwd"]:
+            continue
+        entries.append(dict(zip(fields, row)))
+    return entries, None
 
 
 def verify_password(uid, pwd):
-    u = find_user(uid)
-    if not u:
-        return False
-    return u.get("pwd", "") == pwd
+    return user_store.verify_password(uid, pwd)
 
 
 def verify_totp(uid, token):
     if pyotp is None:
         return False
-    u = find_user(uid)
-    if not u:
-        return False
-    secret = (u.get("totp") or "").strip()
-    if not secret:
-        return False
-    try:
-        totp = pyotp.TOTP(secret)
-        return totp.verify(token, valid_window=1)
-    except Exception:
-        return False
+    return user_store.verify_totp(uid, token)
 
 
 def is_admin(uid):
-    u = find_user(uid)
-    return bool(u and u.get("mode") == "admin")
+    return user_store.is_admin(uid)
 
 
 # ---------- variables handling (copié du app principal) ----------
@@ -205,176 +177,25 @@ def set_variable(key, value):
 
 
 # ---------- Flask app ----------
-def create_app():
-    app = Flask(__name__)
-    app.secret_key = os.environ.get("FLASK_SECRET_KEY", None) or os.urandom(24)
+# Templates du panel (templates/admin_*.html), compilés une seule fois par Jinja
+ADMIN_TEMPLATES = ("admin_base.html", "admin_login.html", "admin_2fa.html", "admin_panel.html")
 
-    # Votre style copié directement dans l'en-tête, adapté pour centrer les éléments de connexion
-    inline_style = """
-    body{font-family:Arial,Helvetica,sans-serif;background:#f3f4f6;margin:0;padding:20px}
-    .card{max-width:600px;margin:24px auto;background:white;padding:20px;border-radius:10px;box-shadow:0 8px 30px rgba(0,0,0,0.06)}
-    .card-center { text-align: center; }
-    .title { margin: 0 0 16px 0; font-size: 1.4rem; text-align:center; }
-    .form-container { text-align: center; }
-    .form { display:inline-block; width:100%; max-width:420px; text-align:left; }
-    .form-row { margin-bottom: 12px; }
-    .input { padding:10px; border-radius:8px; border:1px solid #ccc; width:100%; box-sizing: border-box; }
-    .btn { padding:10px 14px; border-radius:8px; border:none; background:#ff7a00; color:white; cursor:pointer; display:inline-block; }
-    .login-button-row { text-align:center; }
-    .small{font-size:0.9em;color:#555}
-    .table{width:100%;border-collapse:collapse;margin-top:12px}
-    .table th,.table td{padding:8px;border-bottom:1px solid #eee;text-align:left}
-    .badge{display:inline-block;padding:6px 10px;border-radius:8px;background:#eef}
-    #debrideForm { display: flex; align-items: center; }
-    #debrideForm button { margin-left: 12px; }
-    .help { color:#666; font-size:0.95em; text-align:center; }
-    """
 
-    base_head = f"""
-    <!doctype html>
-    <html lang="fr">
-    <head>
-      <meta charset="utf-8">
-      <meta name="viewport" content="width=device-width,initial-scale=1">
-      <title>Admin Panel</title>
-      <style>{inline_style}</style>
-    </head>
-    <body>
-    <div class="card card-center">
-    """
+def warm_templates(flask_app):
+    """Précompile les templates du panel avant la première requête."""
+    for name in ADMIN_TEMPLATES:
+        flask_app.jinja_env.get_template(name)
 
-    base_footer = """
-    </div>
-    </body>
-    </html>
-    """
 
-    # Login template: placeholders inside inputs, centered title and form
-    login_tpl = base_head + """
-    <h1 class="title">Admin Panel - Connexion</h1>
-    {% with messages = get_flashed_messages() %}
-      {% if messages %}
-        <div class="small">
-          {% for m in messages %}
-            <div>{{ m }}</div>
-          {% endfor %}
-        </div>
-      {% endif %}
-    {% endwith %}
-    <div class="form-container">
-      <form method="post" action="{{ url_for('admin_login') }}" class="form" autocomplete="off">
-        <div class="form-row">
-          <input name="id" class="input" placeholder="Identifiant" autofocus>
-        </div>
-        <div class="form-row">
-          <input name="pwd" type="password" class="input" placeholder="Mot de passe">
-        </div>
-        <div class="form-row login-button-row">
-          <button class="btn" type="submit">Suivant (2FA)</button>
-        </div>
-      </form>
-    </div>
-    """ + base_footer
-
-    # Two-factor template: show "Connecté en tant que <user>"
-    twofa_tpl = base_head + """
-    <h1 class="title">Admin Panel - 2FA</h1>
-    {% with messages = get_flashed_messages() %}
-      {% if messages %}
-        <div class="small">
-          {% for m in messages %}
-            <div>{{ m }}</div>
-          {% endfor %}
-        </div>
-      {% endif %}
-    {% endwith %}
-    <p class="small">Connecté en tant que <strong>{{ auth_user }}</strong></p>
-    <div class="form-container">
-      <form method="post" action="{{ url_for('admin_2fa') }}" class="form" autocomplete="off">
-        <div class="form-row">
-          <input name="token" class="input" placeholder="TOTP">
-        </div>
-        <div class="form-row login-button-row">
-          <button class="btn" type="submit">Valider 2FA</button>
-        </div>
-      </form>
-    </div>
-    """ + base_footer
-
-    # Template principal du panel : show "Connecté en tant que <user> — Déconnexion"
-    panel_tpl = base_head + """
-    <h1 class="title">Admin Panel</h1>
-    {% with messages = get_flashed_messages() %}
-      {% if messages %}
-        <div class="small">
-          {% for m in messages %}
-            <div>{{ m }}</div>
-          {% endfor %}
-        </div>
-      {% endif %}
-    {% endwith %}
-    <p class="small">Connecté en tant que <strong>{{ admin_user }}</strong> — <a href="{{ url_for('admin_logout') }}">Déconnexion</a></p>
-
-    <h2 class="small">Variables :</h2>
-    {% for k in ALLOWED_VARIABLES %}
-      {% set v = variables.get(k, '0') %}
-      <div style="margin-bottom:8px;">
-        <strong>{{ k }}</strong> : <span class="badge">{{ 'ON' if v=='1' else 'OFF' }}</span>
-        <form method="post" action="{{ url_for('admin_toggle_variable') }}" style="display:inline;margin-left:12px;">
-          <input type="hidden" name="var" value="{{ k }}">
-          <input type="hidden" name="value" value="{{ '0' if v=='1' else '1' }}">
-          <button class="btn" type="submit">{{ 'Turn OFF' if v=='1' else 'Turn ON' }}</button>
-        </form>
-      </div>
-    {% endfor %}
-
-    <h2 class="small">Utilisateurs :</h2>
-    <div>
-      <h3 class="small">Ajouter</h3>
-      <form method="post" action="{{ url_for('admin_add_user') }}">
-        <div class="form-row"><input name="id" class="input" placeholder="id" required></div>
-        <div class="form-row"><input name="pwd" class="input" placeholder="pwd" required></div>
-        <div class="form-row"><input name="totp" class="input" placeholder="totp (base32)"></div>
-        <div class="form-row">
-          <label>mode:
-            <select name="mode" class="input" style="width:auto; display:inline-block; padding:8px; margin-left:8px;">
-              <option value="user">user</option><option value="admin">admin</option>
-            </select>
-          </label>
-        </div>
-        <div class="form-row"><button class="btn" type="submit">Ajouter</button></div>
-      </form>
-    </div>
-
-    <h3 class="small">Ajouter :</h3>
-    <table class="table" role="table" aria-label="users">
-      <thead><tr><th>id</th><th>mode</th><th>actions</th></tr></thead>
-      <tbody>
-      {% for u in users %}
-        <tr>
-          <td>{{ u.id }}</td>
-          <td>{{ u.mode }}</td>
-          <td>
-            <form style="display:inline" method="post" action="{{ url_for('admin_set_role') }}">
-              <input type="hidden" name="id" value="{{u.id}}">
-              {% if u.mode == 'admin' %}
-                <input type="hidden" name="mode" value="user">
-                <button class="btn" type="submit">Retirer admin</button>
-              {% else %}
-                <input type="hidden" name="mode" value="admin">
-                <button class="btn" type="submit">Donner admin</button>
-              {% endif %}
-            </form>
-            <form style="display:inline" method="post" action="{{ url_for('admin_remove_user') }}">
-              <input type="hidden" name="id" value="{{ u.id }}">
-              <button class="btn" type="submit" onclick="return confirm('Supprimer {{u.id}} ?')">Supprimer</button>
-            </form>
-          </td>
-        </tr>
-      {% endfor %}
-      </tbody>
-    </table>
-    """ + base_footer
+def create_app():
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("FLASK_SECRET_KEY", None) or os.urandom(24)
+    # cookie distinct de celui du site principal : derrière run_all, les deux apps partagent
+    # le même domaine et le même chemin, et ne doivent pas écraser la session l'une de l'autre
+    app.config["SESSION_COOKIE_NAME"] = "admin_session"
+    if get_session_interface() is not None:
+        app.session_interface = get_session_interface()
+    metrics.instrument_templates(app)
 
     @app.route("/adminpanel/login", methods=["GET", "POST"])
     def admin_login():
@@ -384,13 +205,16 @@ def create_app():
             if not uid or not pwd:
                 flash("Identifiant et mot de passe requis.")
                 return redirect(url_for("admin_login"))
+            wait = LOGIN_LIMITER.check(request.remote_addr, uid)
+            if wait:
+                return too_many_requests(wait)
             if not verify_password(uid, pwd):
                 flash("Identifiants invalides.")
                 return redirect(url_for("admin_login"))
             # stage1 passed: store auth_user and go to 2FA
             session["auth_user"] = uid
             return redirect(url_for("admin_2fa"))
-        return render_template_string(login_tpl)
+        return render_template("admin_login.html")
 
     @app.route("/adminpanel/2FA", methods=["GET", "POST"])
     def admin_2fa():
@@ -403,6 +227,9 @@ def create_app():
             if not token:
                 flash("Code TOTP requis.")
                 return redirect(url_for("admin_2fa"))
+            wait = LOGIN_LIMITER.check(request.remote_addr, auth_user)
+            if wait:
+                return too_many_requests(wait)
             if pyotp is None:
                 flash("pyotp non installé : impossible de vérifier le code TOTP.")
                 return redirect(url_for("admin_login"))
@@ -418,7 +245,7 @@ def create_app():
             session.pop("auth_user", None)
             session["admin_user"] = auth_user
             return redirect(url_for("admin_panel"))
-        return render_template_string(twofa_tpl, auth_user=auth_user)
+        return render_template("admin_2fa.html", auth_user=auth_user)
 
     @app.route("/adminpanel/logout")
     def admin_logout():
@@ -434,10 +261,10 @@ def create_app():
         if not is_admin(session.get("admin_user")):
             flash("Accès refusé : non-admin.")
             return redirect(url_for("admin_login"))
-        users = read_users()
+        users = user_store.list()
         variables = read_variables()
         # Passer ALLOWED_VARIABLES au template pour forcer l'ordre et garantir les boutons correspondent
-        return render_template_string(panel_tpl, admin_user=session.get("admin_user"), users=users, variables=variables, ALLOWED_VARIABLES=ALLOWED_VARIABLES)
+        return render_template("admin_panel.html", admin_user=session.get("admin_user"), users=users, variables=variables, ALLOWED_VARIABLES=ALLOWED_VARIABLES)
 
     @app.route("/adminpanel/add_user", methods=["POST"])
     def admin_add_user():
@@ -473,6 +300,33 @@ def create_app():
         flash(msg)
         return redirect(url_for("admin_panel"))
 
+    @app.route("/adminpanel/bulk_users", methods=["POST"])
+    def admin_bulk_users():
+        if "admin_user" not in session or not is_admin(session.get("admin_user")):
+            flash("Accès refusé.")
+            return redirect(url_for("admin_login"))
+        upload = request.files.get("file")
+        if upload is None or not upload.filename:
+            flash("Aucun fichier reçu.")
+            return redirect(url_for("admin_panel"))
+        entries, err = parse_bulk_users(upload.filename, upload.read())
+        if err:
+            flash(err)
+            return redirect(url_for("admin_panel"))
+        ok, msg = _saved(user_store.bulk_upsert(entries))
+        flash(msg)
+        return redirect(url_for("admin_panel"))
+
+    @app.route("/adminpanel/metrics", methods=["GET"])
+    def admin_metrics():
+        # admin connecté, ou jeton METRICS_TOKEN (en-tête Authorization: Bearer) pour un collecteur Prometheus
+        token = os.environ.get("METRICS_TOKEN")
+        auth = request.headers.get("Authorization", "")
+        authorized = bool(token) and hmac.compare_digest(auth, f"Bearer {token}")
+        if not authorized and ("admin_user" not in session or not is_admin(session.get("admin_user"))):
+            return Response("forbidden\n", status=403, mimetype="text/plain")
+        return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
     @app.route("/adminpanel/toggle_variable", methods=["POST"])
     def admin_toggle_variable():
         if "admin_user" not in session or not is_admin(session.get("admin_user")):
@@ -497,5 +351,6 @@ else:
     port = 5000
 
 if __name__ == "__main__":
+    warm_templates(app)
     print(f"Serveur: http://{hote}:{port}/adminpanel/login")
     app.run(host=hote, port=port, debug=True)
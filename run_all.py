@@ -7,25 +7,51 @@ Comportement :
 - Monte une application WSGI combinée qui dispatch :
     * /adminpanel/* -> admin app
     * tout le reste  -> main app
-- Lance un serveur de développement via werkzeug.run_simple (pratique pour dev).
+- Lance un serveur de développement via werkzeug.run_simple (pratique pour dev),
+  ou avec --prod un serveur de production (gunicorn pre-fork ou waitress multi-thread).
 
 Usage :
     python run_all.py
+    python run_all.py --prod [--server gunicorn|waitress] [--workers N] [--threads N]
+                      [--keepalive S] [--graceful-timeout S] [--max-requests N]
+    gunicorn --preload -w 4 --threads 4 wsgi:application   (voir wsgi.py)
 
 Environnements :
     HOST (default 0.0.0.0)
     PORT (default 5000)
     FLASK_DEBUG=1 => active use_reloader et use_debugger
+    WARM_TEMPLATES=0 => ne pas précompiler les templates au démarrage
+    PROD=1, WSGI_SERVER, WEB_WORKERS, WEB_THREADS, WEB_KEEPALIVE, WEB_GRACEFUL_TIMEOUT,
+    WEB_MAX_REQUESTS => valeurs par défaut des options ci-dessus
+    ROSTER_TRIGRAM_INDEX=1|0|auto, ROSTER_TRIGRAM_MIN_ROWS => index de trigrammes pour /search
+      (auto : à partir de 50000 lignes)
+    ROSTER_BACKEND=memory|sqlite|mmap, ROSTER_SQLITE_DIR / ROSTER_MMAP_DIR (data/) => CSV servi
+      depuis la mémoire, importé dans data/<csv>.<empreinte>.sqlite3 (FTS5 trigram), ou
+      converti en data/<csv>.roster lu par mmap (pages partagées entre workers) ; les fichiers
+      dérivés sont reconstruits quand le CSV change
+    ROSTER_SNAPSHOT=0 => ignorer le snapshot binaire précompilé (generateur/build_roster_snapshot.py) ;
+      par défaut il est chargé par mmap s'il correspond encore au CSV, sinon le CSV est lu
+    COMPRESS=0, COMPRESS_MIN_SIZE (1024 octets), COMPRESS_LEVEL (6) => compression gzip/brotli
+    LOGIN_LIMIT=0, LOGIN_IP_PER_MIN / LOGIN_IP_BURST (30), LOGIN_USER_PER_MIN / LOGIN_USER_BURST (10)
+      => limitation des tentatives de connexion (429)
+    SESSION_BACKEND=cookie|memory|sqlite, SESSION_SQLITE_PATH, SESSION_TTL => sessions côté serveur
+      (memory : un seul processus ; avec plusieurs workers, utiliser sqlite)
+    SEARCH_CACHE_SIZE (256, 0 = désactivé), SEARCH_CACHE_TTL (300 s), SEARCH_CACHE_MAX_ROWS
+      => cache LRU des résultats de /search
 
 Remarques :
 - Ce script tente d'accommoder plusieurs conventions d'export dans vos modules.
-- En production, préférez gunicorn / uWSGI / waitress et montez correctement les apps.
+- En production, utilisez --prod (ou wsgi.py). Avec plusieurs workers, gardez le
+  préchargement (preload) : le CSV et users.txt sont parsés une fois avant le fork, et la
+  clé de session du panel (os.urandom sans FLASK_SECRET_KEY) est la même pour tous les workers.
 """
 import os
 import importlib
 from werkzeug.serving import run_simple
 from typing import Callable
 from file.variables_reader import read_variables
+from file.metrics import MetricsMiddleware, static_routes
+from file.compression import CompressionMiddleware
 
 vars = read_variables()
 serveur = int(vars.get("serveur", "0"))
@@ -99,9 +125,109 @@ def create_combined_app():
             return admin_app(environ, start_response)
         return main_app(environ, start_response)
 
-    return application
+    # durées par route (export Prometheus : /adminpanel/metrics)
+    routes = []
+    for wsgi_app in (main_app, admin_app):
+        if hasattr(wsgi_app, "url_map"):
+            routes.extend(static_routes(wsgi_app))
+    # compression gzip/brotli (mesurée dans les durées de requête)
+    return MetricsMiddleware(CompressionMiddleware.wrap(application), routes=routes)
+
+def preload_caches():
+    """
+    Charge la config, le CSV et users.txt dans le processus courant. Appelé avant le fork
+    des workers (mode production), les structures sont partagées en copy-on-write ; les
+    threads de surveillance démarrent ensuite dans chaque worker à la première requête.
+    """
+    import app as main_module
+    main_module.config.load()
+    _, _, snapshot = main_module.roster.load()
+    snapshot.suggest("a", 1)  # construit l'index de préfixes avant le fork
+    main_module.user_store.users()
+
+def warm_up(preload=False):
+    """
+    Précompile les templates des deux applications (désactivable avec WARM_TEMPLATES=0).
+    preload=True : précharge aussi les caches puis gèle le ramasse-miettes (gc.freeze) pour
+    que les workers forkés ne recopient pas les pages de ces objets.
+    """
+    import app as main_module
+    import panel_admin
+    if os.environ.get("WARM_TEMPLATES", "1") != "0":
+        main_module.warm_templates()
+        panel_admin.warm_templates(panel_admin.app)
+    if preload:
+        import gc
+        preload_caches()
+        gc.collect()
+        gc.freeze()
+
+def serve_gunicorn(app, host, port, workers, threads, keepalive, graceful_timeout, max_requests):
+    """Serveur pre-fork : app préchargée dans le maître (preload_app) puis forkée dans chaque worker."""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise RuntimeError("gunicorn n'est pas installé (pip install gunicorn) ; essayez --server waitress.")
+
+    class CombinedApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                "threads": threads,
+                "worker_class": "gthread" if threads > 1 else "sync",
+                "keepalive": keepalive,
+                "graceful_timeout": graceful_timeout,
+                "max_requests": max_requests,
+                "max_requests_jitter": max_requests // 10 if max_requests else 0,
+                "preload_app": True,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    # SIGHUP sur le maître => rechargement gracieux des workers (graceful_timeout)
+    CombinedApplication().run()
+
+def serve_waitress(app, host, port, threads, keepalive):
+    """Serveur multi-thread mono-processus (Windows ou hébergement sans fork)."""
+    try:
+        from waitress import serve
+    except ImportError:
+        raise RuntimeError("waitress n'est pas installé (pip install waitress).")
+    # channel_timeout : durée d'inactivité avant fermeture d'une connexion keep-alive
+    serve(app, host=host, port=port, threads=threads, channel_timeout=max(keepalive, 1))
+
+def parse_args(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Lance le site principal et le panel admin sur la même adresse.")
+    parser.add_argument("--prod", action="store_true", default=os.environ.get("PROD", "0") == "1",
+                        help="serveur de production au lieu de werkzeug.run_simple")
+    parser.add_argument("--server", choices=("gunicorn", "waitress"), default=os.environ.get("WSGI_SERVER", "gunicorn"))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_WORKERS", (os.cpu_count() or 1) * 2 + 1)))
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("WEB_THREADS", "4")))
+    parser.add_argument("--keepalive", type=int, default=int(os.environ.get("WEB_KEEPALIVE", "5")),
+                        help="secondes de keep-alive HTTP")
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.environ.get("WEB_GRACEFUL_TIMEOUT", "30")),
+                        help="délai laissé aux requêtes en cours lors d'un rechargement (SIGHUP)")
+    parser.add_argument("--max-requests", type=int, default=int(os.environ.get("WEB_MAX_REQUESTS", "0")),
+                        help="recycler un worker après N requêtes (0 = jamais)")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
+    args = parse_args()
     app = create_combined_app()
-    print(f"Serving combined apps on http://{HOST}:{PORT}  (admin panel at /adminpanel)")
-    run_simple(HOST, PORT, app, use_reloader=DEBUG, use_debugger=DEBUG)
\ No newline at end of file
+    if not args.prod:
+        warm_up()
+        print(f"Serving combined apps on http://{HOST}:{PORT}  (admin panel at /adminpanel)")
+        run_simple(HOST, PORT, app, use_reloader=DEBUG, use_debugger=DEBUG)
+    elif args.server == "gunicorn":
+        warm_up(preload=True)
+        print(f"gunicorn: {args.workers} worker(s) x {args.threads} thread(s) sur http://{HOST}:{PORT}")
+        serve_gunicorn(app, HOST, PORT, args.workers, args.threads, args.keepalive, args.graceful_timeout, args.max_requests)
+    else:
+        warm_up(preload=True)
+        print(f"waitress: {args.threads} thread(s) sur http://{HOST}:{PORT}")
+        serve_waitress(app, HOST, PORT, args.threads, args.keepalive)
@@ -0,0 +1,15 @@
+"""
+wsgi.py - point d'entrée WSGI de production pour l'application combinée (site + panel admin)
+
+Exemples :
+    gunicorn --preload -w 4 --threads 4 --keep-alive 5 --graceful-timeout 30 wsgi:application
+    waitress-serve --threads 8 wsgi:application
+
+Le module précharge les caches (config, CSV, users.txt) et précompile les templates à
+l'import : avec --preload, gunicorn fait cet import une seule fois dans le maître et les
+workers forkés partagent ces données en copy-on-write.
+"""
+from run_all import create_combined_app, warm_up
+
+application = create_combined_app()
+warm_up(preload=True)